@@ -0,0 +1,111 @@
+import os
+import subprocess
+import logging
+from math import gcd
+import numpy as np
+import soundfile as sf
+
+logger = logging.getLogger(__name__)
+
+NARRATION_SAMPLE_RATE = 24000  # Taxa de saída do Kokoro
+OUTPUT_SAMPLE_RATE = 48000  # Taxa padrão do AAC em vídeo (razão inteira 2:1 com o Kokoro)
+MUSIC_GAIN = 0.2  # Volume baixo para não competir com a narração
+# Erro de leitura do libsndfile (sf.LibsndfileError só existe nas versões novas do soundfile)
+SOUNDFILE_ERRORS = (RuntimeError, getattr(sf, "LibsndfileError", RuntimeError))
+
+def resample(samples, source_rate, target_rate):
+    """Reamostra com filtro polifásico (sem operação se as taxas forem iguais)"""
+    if source_rate == target_rate:
+        return samples
+    from scipy.signal import resample_poly  # scipy.signal leva ~1,5 s para importar
+    factor = gcd(source_rate, target_rate)
+    return resample_poly(samples, target_rate // factor, source_rate // factor, axis=0).astype(np.float32)
+
+def read_audio(path):
+    """Lê um arquivo de áudio como float32 (frames, canais); usa o ffmpeg para formatos que o libsndfile não abre"""
+    try:
+        samples, sample_rate = sf.read(path, dtype="float32", always_2d=True)
+        return samples, sample_rate
+    except SOUNDFILE_ERRORS:
+        pass
+    from encoder import ffmpeg_binary
+    cmd = [
+        ffmpeg_binary(), "-loglevel", "error", "-i", path,
+        "-f", "f32le", "-ac", "2", "-ar", str(OUTPUT_SAMPLE_RATE), "-"
+    ]
+    raw = subprocess.run(cmd, check=True, stdout=subprocess.PIPE).stdout
+    return np.frombuffer(raw, dtype=np.float32).reshape(-1, 2), OUTPUT_SAMPLE_RATE
+
+def gain_ramp(n_samples, n_fade_in, n_fade_out):
+    """Curva de ganho linear com entrada e saída suaves, ou None se não houver fade"""
+    if n_fade_in <= 0 and n_fade_out <= 0:
+        return None
+    gain = np.ones(n_samples, dtype=np.float32)
+    if n_fade_in > 0:
+        n = min(n_fade_in, n_samples)
+        gain[:n] = np.linspace(0, 1, n_fade_in, endpoint=False, dtype=np.float32)[:n]
+    if n_fade_out > 0:
+        n = min(n_fade_out, n_samples)
+        gain[n_samples - n:] *= np.linspace(1, 0, n_fade_out, endpoint=False, dtype=np.float32)[n_fade_out - n:]
+    return gain
+
+def mix_loop(mix, samples, gain):
+    """Repete o áudio até cobrir a mixagem e soma com o ganho indicado (no lugar)"""
+    if len(samples) == 0:
+        return mix
+    repeats = int(np.ceil(len(mix) / len(samples)))
+    mix += gain * np.tile(samples, (repeats, 1))[:len(mix)]
+    return mix
+
+class AudioTimeline:
+    """Linha do tempo de áudio em memória (float32), montada com offsets exatos em amostras"""
+
+    def __init__(self, duration, sample_rate, channels=1):
+        self.sample_rate = sample_rate
+        self.samples = np.zeros((int(round(duration * sample_rate)), channels), dtype=np.float32)
+
+    def place(self, samples, start, fade_in=0.0, fade_out=0.0):
+        """Soma o áudio a partir de start (segundos), com crossfade linear nas bordas"""
+        offset = int(round(start * self.sample_rate))
+        n = min(len(samples), len(self.samples) - offset)
+        if n <= 0:
+            return
+        gain = gain_ramp(len(samples), int(round(fade_in * self.sample_rate)), int(round(fade_out * self.sample_rate)))
+        if gain is not None:
+            samples = samples * gain[:, None]
+        self.samples[offset:offset + n] += samples[:n]
+
+def build_audio_track(content_data, starts, transitions, duration, config, output_path):
+    """Monta narração e música de fundo em um único WAV para o mux.
+
+    As narrações de 24 kHz são posicionadas na linha do tempo com crossfade nas
+    regiões de dissolve, reamostradas uma única vez para 48 kHz e misturadas
+    com a música em loop.
+    """
+    narration = AudioTimeline(duration, NARRATION_SAMPLE_RATE)
+    for i, (item, start) in enumerate(zip(content_data, starts)):
+        samples, sample_rate = sf.read(item["audio_path"], dtype="float32", always_2d=True)
+        samples = resample(samples.mean(axis=1, keepdims=True), sample_rate, NARRATION_SAMPLE_RATE)
+        in_type, in_duration = transitions[i]
+        out_type, out_duration = transitions[i + 1] if i + 1 < len(transitions) else (None, 0.0)
+        narration.place(
+            samples, start,
+            fade_in=in_duration if in_type == "dissolve" else 0.0,
+            fade_out=out_duration if out_type == "dissolve" else 0.0
+        )
+
+    mix = resample(narration.samples, NARRATION_SAMPLE_RATE, OUTPUT_SAMPLE_RATE)
+    if getattr(config, "audio_path", None) and os.path.exists(config.audio_path):
+        try:
+            music, music_rate = read_audio(config.audio_path)
+            music = resample(music[:, :2], music_rate, OUTPUT_SAMPLE_RATE)
+            if music.shape[1] == 2:
+                mix = np.repeat(mix, 2, axis=1)  # Estéreo quando a música for estéreo
+            mix_loop(mix, music, MUSIC_GAIN)
+        except Exception as e:
+            logger.error(f"Erro ao adicionar música de fundo: {e}")
+
+    np.clip(mix, -1.0, 1.0, out=mix)
+    # Converter para PCM 16 bits aqui é bem mais rápido que deixar para o libsndfile
+    sf.write(output_path, (mix * 32767).astype(np.int16), OUTPUT_SAMPLE_RATE, subtype="PCM_16")
+    return output_path
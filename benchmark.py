@@ -0,0 +1,464 @@
+import os
+import sys
+import json
+import subprocess
+import time
+import argparse
+import tempfile
+import tracemalloc
+import numpy as np
+import soundfile as sf
+from PIL import Image
+from metrics import peak_rss_mb
+
+RESOLUCOES = {"short": (1080, 1920), "longo": (1920, 1080)}
+
+# Presets da suíte: resolução, número de cenas, duração de cada cena (s) e frames medidos por estágio
+PRESETS = {
+    "short": {"resolution": (1080, 1920), "scenes": 3, "scene_duration": 3.0, "frames": 48},
+    "long": {"resolution": (1920, 1080), "scenes": 12, "scene_duration": 5.0, "frames": 96}
+}
+TEXTOS_CENAS = [
+    "Era uma vez um pequeno robô que sonhava em ver o mar",
+    "Ele atravessou desertos e cidades esquecidas pelo tempo",
+    "Até que finalmente ouviu o som das ondas ao longe"
+]
+ALLOC_FRAMES = 4  # Frames medidos com tracemalloc (o rastreamento deixa tudo bem mais lento)
+REGRESSION_TOLERANCE = 0.15  # Queda de fps aceita em relação ao baseline
+
+class _BenchConfig:
+    """Configuração mínima usada pelos benchmarks de renderização"""
+    def __init__(self, final_resolution, fps=24, **overrides):
+        self.final_resolution = final_resolution
+        self.fps = fps
+        self.scene_effects = []
+        self.add_subtitles = False
+        self.subtitle_font = None
+        self.audio_path = None
+        self.output_dir = "benchmark_output"
+        self.output_filename = "benchmark.mp4"
+        self.output_backend = "ffmpeg"
+        self.render_mode = "single"
+        self.render_workers = None
+        self.segment_cache = False
+        self.encoder_crf = None
+        self.encoder_preset = None
+        self.encoder_threads = None
+        self.encoder_gop = None
+        self.transitions = True
+        self.bitrate = "5000k"
+        # Geração (difusão + TTS) com os pipelines de teste
+        self.device = "cpu"
+        self.seed = 0
+        self.voice = "pm_alex"
+        self.lang_code = "p"
+        self.tts_speed = 1.0
+        self.tts_workers = 1
+        self.pipeline_queue_size = 8
+        self.image_batch_size = 2
+        self.gen_resolution = (1024, 1024)
+        self.scheduler = None
+        self.num_inference_steps = 25
+        self.guidance_scale = 3.0
+        self.cache_dir = "cache"
+        self.image_cache_max_bytes = 1024 ** 3
+        self.audio_cache_max_bytes = 1024 ** 3
+        self.__dict__.update(overrides)
+
+def synthetic_image(path, size=(1024, 1024), seed=0):
+    """Salva uma imagem RGB aleatória no tamanho gerado pelo Playground V2.5"""
+    rng = np.random.default_rng(seed)
+    Image.fromarray(rng.integers(0, 256, (size[1], size[0], 3), dtype=np.uint8)).save(path)
+    return path
+
+def synthetic_narration(path, duration, freq=220.0, sample_rate=24000):
+    """Salva uma narração sintética (senoide) no formato de saída do Kokoro"""
+    t = np.arange(int(duration * sample_rate)) / sample_rate
+    sf.write(path, (0.2 * np.sin(2 * np.pi * freq * t)).astype(np.float32), sample_rate, subtype="PCM_16")
+    return path
+
+class _StubImages:
+    def __init__(self, images):
+        self.images = images
+
+class StubImagePipeline:
+    """Substitui o DiffusionPipeline nos benchmarks: imagens aleatórias, sem GPU nem download"""
+    name_or_path = "benchmark/stub-image"
+
+    def __call__(self, prompt, width=1024, height=1024, **kwargs):
+        rng = np.random.default_rng(len(prompt))
+        return _StubImages([
+            Image.fromarray(rng.integers(0, 256, (height, width, 3), dtype=np.uint8)) for _ in prompt
+        ])
+
+class StubKokoroPipeline:
+    """Substitui o KPipeline nos benchmarks: 0,3 s de senoide por palavra, em segmentos por frase"""
+    repo_id = "benchmark/stub-tts"
+    sample_rate = 24000
+
+    def __call__(self, text, voice=None, speed=1.0):
+        t = np.arange(int(0.3 * self.sample_rate / speed)) / self.sample_rate
+        for sentence in text.split("."):
+            words = sentence.split()
+            if words:
+                yield sentence, "", np.tile(0.2 * np.sin(2 * np.pi * 220 * t), len(words)).astype(np.float32)
+
+def legacy_scene_clip(image_path, duration, final_resolution):
+    """Caminho antigo do create_scene_clip: resize 1.1x + vfx.resize por frame + crop"""
+    from moviepy.editor import ImageClip
+    import moviepy.video.fx.all as vfx
+    width, height = final_resolution
+    img_clip = ImageClip(image_path)
+    img_width, img_height = img_clip.size
+    scale_factor = max(width / img_width, height / img_height) * 1.1
+    img_clip = img_clip.resize(width=img_width * scale_factor, height=img_height * scale_factor)
+    zoomed_clip = img_clip.fx(vfx.resize, lambda t: 1.0 + (0.15 * t / duration))
+    return zoomed_clip.set_duration(duration).crop(
+        x_center=zoomed_clip.w / 2, y_center=zoomed_clip.h / 2, width=width, height=height
+    )
+
+def measure_stage(frame_fn, n_frames, alloc_frames=ALLOC_FRAMES):
+    """Mede frame_fn(n) para n em range(n_frames): fps, tempo total, pico de RSS e alocações.
+
+    As alocações são medidas em uma segunda passada curta com tracemalloc,
+    para não distorcer o tempo: pico de memória alocada e blocos novos por frame.
+    """
+    begin = time.perf_counter()
+    for n in range(n_frames):
+        frame_fn(n)
+    wall = time.perf_counter() - begin
+    result = {"fps": n_frames / wall if wall > 0 else None, "tempo_s": wall, "frames": n_frames, "pico_rss_mb": peak_rss_mb()}
+    if alloc_frames:
+        tracemalloc.start()
+        before = tracemalloc.take_snapshot()
+        for n in range(alloc_frames):
+            frame_fn(n)
+        after = tracemalloc.take_snapshot()
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        new_blocks = sum(max(0, stat.count_diff) for stat in after.compare_to(before, "lineno"))
+        result["alocacoes_por_frame"] = new_blocks / alloc_frames
+        result["alloc_pico_mb"] = peak / 1024 ** 2
+    return result
+
+def measure_once(fn):
+    """Mede um estágio que não é por frame (montagem do áudio, renderização completa, geração)"""
+    begin = time.perf_counter()
+    value = fn()
+    return {"tempo_s": time.perf_counter() - begin, "pico_rss_mb": peak_rss_mb()}, value
+
+def measure_fps(clip, fps, n_frames):
+    """Renderiza n_frames do clipe e retorna frames por segundo"""
+    start = time.perf_counter()
+    for n in range(n_frames):
+        clip.get_frame(n / fps)
+    return n_frames / (time.perf_counter() - start)
+
+def bench_kenburns(n_frames=48):
+    """Compara o Ken Burns antigo (moviepy) com o KenBurnsFrames em shorts e vídeos longos"""
+    from video import create_scene_clip
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        image_path = synthetic_image(os.path.join(tmp, "scene.png"))
+        for name, resolution in RESOLUCOES.items():
+            config = _BenchConfig(resolution)
+            duration = n_frames / config.fps
+            before = measure_fps(legacy_scene_clip(image_path, duration, resolution), config.fps, n_frames)
+            after = measure_fps(create_scene_clip({"image_path": image_path, "duration": duration}, config), config.fps, n_frames)
+            results[name] = {"antes_fps": before, "depois_fps": after, "ganho": after / before}
+            print(f"[{name} {resolution[0]}x{resolution[1]}] antes: {before:.1f} fps | depois: {after:.1f} fps | {after / before:.1f}x")
+    return results
+
+def bench_timeline(n_frames=48, scene_counts=(5, 120), scene_duration=4.0):
+    """Velocidade por frame da linha do tempo plana com poucas e muitas cenas (deve ser a mesma)"""
+    from video import build_timeline
+    results = {}
+    with tempfile.TemporaryDirectory() as tmp:
+        image_path = synthetic_image(os.path.join(tmp, "scene.png"))
+        config = _BenchConfig(RESOLUCOES["short"])
+        for n_scenes in scene_counts:
+            content_data = [{"image_path": image_path, "duration": scene_duration, "prompt": ""}] * n_scenes
+            timeline = build_timeline(content_data, config)
+            # Frames perto do fim do vídeo, atravessando o mesmo tipo de transição (dissolve)
+            start = timeline.starts[3 * ((n_scenes - 1) // 3)] - n_frames / (2 * config.fps)
+            begin = time.perf_counter()
+            for n in range(n_frames):
+                timeline.make_frame(start + n / config.fps)
+            fps = n_frames / (time.perf_counter() - begin)
+            results[f"{n_scenes}_cenas"] = {"fps": fps, "trechos": len(timeline.segments)}
+            print(f"[{n_scenes} cenas] {len(timeline.segments)} trechos | {fps:.1f} fps")
+    return results
+
+# Módulos carregados por cada comando do main.py até começar o trabalho
+COMANDOS_STARTUP = {
+    "validate": ["main", "content"],
+    "storyboard": ["main", "groq"],
+    "render": ["main", "content", "video"],
+    "generate": ["main", "content", "models", "torch", "diffusers", "kokoro"]
+}
+# O que qualquer comando pagava antes dos imports sob demanda (main, config, content e video importavam tudo)
+IMPORTS_ANTIGOS = ["torch", "diffusers", "kokoro", "groq", "moviepy.editor", "cv2", "scipy.signal"]
+
+_STARTUP_SCRIPT = """
+import sys, json, time, importlib
+sys.path.insert(0, {root!r})
+start = time.perf_counter()
+ausentes = []
+for name in {modules!r}:
+    try:
+        importlib.import_module(name)
+    except ImportError:
+        ausentes.append(name)
+print(json.dumps({{"tempo_s": time.perf_counter() - start, "ausentes": ausentes}}))
+"""
+
+def cold_import_time(modules, repeats=3):
+    """Menor tempo de importação dos módulos em um interpretador novo (sem cache de imports)"""
+    root = os.path.dirname(os.path.abspath(__file__))
+    best = None
+    for _ in range(repeats):
+        out = subprocess.run(
+            [sys.executable, "-c", _STARTUP_SCRIPT.format(root=root, modules=list(modules))],
+            check=True, stdout=subprocess.PIPE, text=True, cwd=root
+        ).stdout
+        result = json.loads(out.strip().splitlines()[-1])
+        if best is None or result["tempo_s"] < best["tempo_s"]:
+            best = result
+    return best
+
+def bench_startup(repeats=3):
+    """Tempo de partida a frio de cada comando, antes (imports antigos) e depois (sob demanda)"""
+    results = {}
+    for comando, modules in COMANDOS_STARTUP.items():
+        before = cold_import_time(IMPORTS_ANTIGOS + modules, repeats)
+        after = cold_import_time(modules, repeats)
+        ausentes = sorted(set(before["ausentes"]) | set(after["ausentes"]))
+        results[comando] = {"antes_s": before["tempo_s"], "depois_s": after["tempo_s"], "ausentes": ausentes}
+        nota = f" (não instalados: {', '.join(ausentes)})" if ausentes else ""
+        print(f"[{comando}] antes: {before['tempo_s']:.2f}s | depois: {after['tempo_s']:.2f}s{nota}")
+    return results
+
+def synthetic_project(output_dir, preset):
+    """Cenas sintéticas do preset: imagens 1024x1024 aleatórias, narrações em senoide e textos fixos"""
+    content_data = []
+    for i in range(preset["scenes"]):
+        content_data.append({
+            "image_path": synthetic_image(os.path.join(output_dir, f"scene_{i:03d}.png"), seed=i),
+            "audio_path": synthetic_narration(os.path.join(output_dir, f"scene_{i:03d}.wav"), preset["scene_duration"], freq=220 + 40 * i),
+            "duration": preset["scene_duration"],
+            "prompt": TEXTOS_CENAS[i % len(TEXTOS_CENAS)]
+        })
+    return content_data
+
+def _print_stage(preset_name, name, result):
+    fps_text = f"{result['fps']:.1f} fps | " if result.get("fps") else ""
+    print(f"[{preset_name}] {name}: {fps_text}{result['tempo_s']:.2f}s | pico RSS {result['pico_rss_mb']:.0f} MB")
+
+def run_suite(preset_name):
+    """Mede cada estágio da renderização (e a geração, com pipelines de teste) para um preset"""
+    from video import create_scene_clip, build_timeline, create_narrative_video, CinematicEffects
+    from subtitles import SubtitleRenderer
+    from transitions import TRANSITIONS, get_transition
+    from audio import build_audio_track
+    from encoder import FFmpegPipeWriter, encoder_settings
+    preset = PRESETS[preset_name]
+    results = {}
+
+    def record(name, result):
+        results[name] = result
+        _print_stage(preset_name, name, result)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        config = _BenchConfig(preset["resolution"], output_dir=tmp, cache_dir=os.path.join(tmp, "cache"))
+        content_data = synthetic_project(tmp, preset)
+        fps, n_frames = config.fps, preset["frames"]
+
+        scene = create_scene_clip(content_data[0], config)
+        record("cena_kenburns", measure_stage(lambda n: scene.get_frame(n / fps), n_frames))
+        base = scene.get_frame(0).copy()
+        other = create_scene_clip(content_data[-1], config).get_frame(0).copy()
+
+        # Legendas desenhadas sobre uma cópia do frame, como no buffer do Ken Burns
+        frame = np.empty_like(base)
+        renderer = SubtitleRenderer(content_data[0]["prompt"], content_data[0]["duration"], config.final_resolution)
+        def subtitle_frame(n):
+            np.copyto(frame, base)
+            return renderer.draw(frame, n / fps, inplace=True)
+        record("legendas", measure_stage(subtitle_frame, n_frames))
+
+        for name in sorted(TRANSITIONS):
+            engine = get_transition(name, config.final_resolution)
+            record(f"transicao_{name}", measure_stage(lambda n: engine.blend(base, other, n / n_frames), n_frames))
+
+        bank = CinematicEffects.grain_bank(0.05)
+        effects = {
+            "color_grading": lambda n: CinematicEffects.grade_image(base, "drama"),
+            "depth_of_field": lambda n: CinematicEffects.apply_depth_of_field(base),
+            "vignette": lambda n: CinematicEffects.apply_vignette(base),
+            "film_grain": lambda n: CinematicEffects.grain_frame(base, bank, n)
+        }
+        for name, effect in effects.items():
+            # Grading e profundidade de campo rodam uma vez por cena no pipeline; poucos frames bastam
+            record(f"efeito_{name}", measure_stage(effect, min(n_frames, 24)))
+
+        timeline = build_timeline(content_data, config)
+        if len(content_data) > 1:
+            # Frames ao redor da primeira transição
+            start = max(0.0, timeline.starts[1] - n_frames / (2 * fps))
+        else:
+            start = 0.0
+        record("timeline", measure_stage(lambda n: timeline.make_frame(start + n / fps), n_frames))
+
+        # Encode isolado: poucos frames prontos reenviados ao ffmpeg
+        samples = [timeline.make_frame(k * timeline.duration / 8).copy() for k in range(8)]
+        def encode():
+            with FFmpegPipeWriter(os.path.join(tmp, "encode.mp4"), config.final_resolution, fps, **encoder_settings(config)) as writer:
+                for n in range(n_frames):
+                    writer.write_frame(samples[n % len(samples)])
+        result, _ = measure_once(encode)
+        result.update(fps=n_frames / result["tempo_s"], frames=n_frames)
+        record("encode", result)
+
+        result, _ = measure_once(lambda: build_audio_track(
+            content_data, timeline.starts, timeline.transitions, timeline.duration, config, os.path.join(tmp, "audio.wav")
+        ))
+        record("audio", result)
+
+        # Renderização completa (linha do tempo + legendas + áudio + encode)
+        config.add_subtitles = True
+        total_frames = int(round(timeline.duration * fps))
+        result, _ = measure_once(lambda: create_narrative_video(config, content_data))
+        result.update(fps=total_frames / result["tempo_s"], frames=total_frames)
+        record("render_completo", result)
+
+        try:
+            import torch  # Os seeds da difusão usam torch.Generator
+            from content import generate_content
+        except ImportError as e:
+            print(f"[{preset_name}] geracao: ignorado ({e})")
+            results["geracao"] = {"ignorado": str(e)}
+        else:
+            prompts = [
+                {
+                    "prompt_image": item["prompt"], "prompt_audio": item["prompt"], "style": "cinematic",
+                    "filename": f"gen_{i:03d}.png", "audio_filename": f"gen_{i:03d}.wav"
+                }
+                for i, item in enumerate(content_data)
+            ]
+            result, _ = measure_once(lambda: generate_content(StubImagePipeline(), StubKokoroPipeline(), prompts, config))
+            result["cenas_por_s"] = len(prompts) / result["tempo_s"]
+            record("geracao", result)
+    return results
+
+def compare_results(results, baseline, tolerance=REGRESSION_TOLERANCE):
+    """Estágios cujo fps caiu mais que a tolerância em relação ao baseline"""
+    regressions = []
+    for preset_name, stages in results["presets"].items():
+        for stage, current in stages.items():
+            previous = baseline.get("presets", {}).get(preset_name, {}).get(stage, {})
+            if not previous.get("fps") or not current.get("fps"):
+                continue
+            ratio = current["fps"] / previous["fps"]
+            if ratio < 1 - tolerance:
+                regressions.append({"preset": preset_name, "estagio": stage, "baseline_fps": previous["fps"], "fps": current["fps"], "razao": ratio})
+    return regressions
+
+def bench_suite(presets=("short",), output=None, baseline=None, tolerance=REGRESSION_TOLERANCE):
+    """Roda a suíte completa, salva o JSON e compara com um baseline salvo (retorna as regressões)"""
+    results = {
+        "data": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": sys.version.split()[0],
+        "cpus": os.cpu_count(),
+        "presets": {name: run_suite(name) for name in presets}
+    }
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2, ensure_ascii=False)
+        print(f"Resultados salvos em: {output}")
+    regressions = []
+    if baseline:
+        with open(baseline, "r", encoding="utf-8") as f:
+            regressions = compare_results(results, json.load(f), tolerance)
+        for r in regressions:
+            print(f"[REGRESSÃO] {r['preset']}/{r['estagio']}: {r['baseline_fps']:.1f} -> {r['fps']:.1f} fps ({r['razao']:.0%})")
+        if not regressions:
+            print(f"Nenhuma regressão acima de {tolerance:.0%} em relação a {baseline}")
+    return regressions
+
+def bench_cpu(preset_name="short", steps=8):
+    """Ponta a ponta com os modelos reais no perfil de CPU: carga, difusão, narração e renderização.
+
+    Feito para nós sem GPU; as variáveis CPU_* de models.py (dtype, threads,
+    checkpoint menor) valem aqui também.
+    """
+    try:
+        from models import load_models
+        from content import generate_content
+        from video import create_narrative_video
+        import torch
+    except ImportError as e:
+        print(f"[cpu] ignorado ({e})")
+        return {"ignorado": str(e)}
+    if torch.cuda.is_available():
+        print("[cpu] aviso: há GPU disponível, os modelos serão carregados nela")
+    preset = PRESETS[preset_name]
+    results = {}
+    result, (pipe, kokoro_pipeline) = measure_once(load_models)
+    results["threads"] = torch.get_num_threads()
+    results["carga"] = result
+    _print_stage("cpu", "carga", result)
+    with tempfile.TemporaryDirectory() as tmp:
+        config = _BenchConfig(
+            preset["resolution"], output_dir=tmp, cache_dir=os.path.join(tmp, "cache"),
+            image_batch_size=1, num_inference_steps=steps
+        )
+        prompts = [
+            {
+                "prompt_image": TEXTOS_CENAS[i % len(TEXTOS_CENAS)], "prompt_audio": TEXTOS_CENAS[i % len(TEXTOS_CENAS)],
+                "style": "cinematic", "filename": f"cena_{i:03d}.png", "audio_filename": f"cena_{i:03d}.wav"
+            }
+            for i in range(preset["scenes"])
+        ]
+        result, content_data = measure_once(lambda: generate_content(pipe, kokoro_pipeline, prompts, config))
+        result.update(cenas=len(prompts), s_por_cena=result["tempo_s"] / len(prompts), passos=config.num_inference_steps)
+        results["geracao"] = result
+        _print_stage("cpu", "geracao", result)
+        result, _ = measure_once(lambda: create_narrative_video(config, content_data))
+        results["render"] = result
+        _print_stage("cpu", "render", result)
+    total = sum(results[name]["tempo_s"] for name in ("carga", "geracao", "render"))
+    print(f"[cpu] total: {total:.1f}s com {results['threads']} thread(s), {results['geracao']['passos']} passos")
+    results["total_s"] = total
+    return results
+
+BENCHMARKS = {
+    "kenburns": bench_kenburns,
+    "timeline": bench_timeline,
+    "suite": bench_suite,
+    "startup": bench_startup,
+    "cpu": bench_cpu,
+}
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmarks do Video Narrative Generator")
+    parser.add_argument("benchmark", choices=sorted(BENCHMARKS), help="Benchmark a executar")
+    parser.add_argument("--preset", choices=sorted(PRESETS) + ["all"], default="short", help="Preset da suíte")
+    parser.add_argument("--output", help="Arquivo JSON com os resultados da suíte")
+    parser.add_argument("--baseline", help="JSON de uma execução anterior para detectar regressões")
+    parser.add_argument("--tolerance", type=float, default=REGRESSION_TOLERANCE, help="Queda de fps aceita (fração)")
+    parser.add_argument("--steps", type=int, default=8, help="Passos de inferência do benchmark cpu")
+    args = parser.parse_args()
+    if args.benchmark == "suite":
+        presets = sorted(PRESETS) if args.preset == "all" else [args.preset]
+        regressions = bench_suite(presets, args.output, args.baseline, args.tolerance)
+        sys.exit(1 if regressions else 0)
+    if args.benchmark == "cpu":
+        results = bench_cpu("long" if args.preset == "long" else "short", args.steps)
+        if args.output:
+            with open(args.output, "w", encoding="utf-8") as f:
+                json.dump(results, f, indent=2, ensure_ascii=False)
+        return
+    BENCHMARKS[args.benchmark]()
+
+if __name__ == "__main__":
+    main()
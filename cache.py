@@ -0,0 +1,181 @@
+import os
+import json
+import time
+import shutil
+import hashlib
+import threading
+import logging
+try:
+    import fcntl  # Trava do índice entre processos (indisponível no Windows)
+except ImportError:
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+INDEX_FLUSH_INTERVAL_S = 5.0  # put() grava o índice no máximo uma vez por intervalo; flush() força a gravação
+
+def make_cache_key(**fields):
+    """Gera a chave de conteúdo (sha256) a partir dos parâmetros que definem o arquivo"""
+    payload = json.dumps(fields, sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def link_or_copy(src, dest):
+    """Cria um hardlink de src em dest, copiando quando o link não é possível"""
+    if os.path.lexists(dest):
+        os.remove(dest)
+    try:
+        os.link(src, dest)
+    except OSError:
+        shutil.copy2(src, dest)
+
+class AssetCache:
+    """Armazém global de arquivos endereçados por conteúdo, com limite de bytes e despejo LRU.
+
+    Cada entrada fica em <root>/<chave[:2]>/<chave><suffix> e é registrada em
+    <root>/index.json com tamanho, último acesso e metadados opcionais. O índice
+    é gravado em lotes e mesclado com o que está em disco, então vários
+    processos podem compartilhar o mesmo cache.
+    """
+
+    def __init__(self, root, max_bytes=None, suffix=""):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.suffix = suffix
+        self.index_path = os.path.join(root, "index.json")
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._lock = threading.RLock()
+        self._dirty = False
+        self._removed = set()  # Chaves despejadas desde a última gravação do índice
+        self._last_flush = time.monotonic()
+        os.makedirs(root, exist_ok=True)
+        self.entries = self._load_index()
+
+    def _load_index(self):
+        """Entradas do índice em disco cujo arquivo ainda existe"""
+        if not os.path.exists(self.index_path):
+            return {}
+        try:
+            with open(self.index_path, "r", encoding="utf-8") as f:
+                entries = json.load(f).get("entries", {})
+        except (OSError, ValueError) as e:
+            logger.warning(f"Índice do cache corrompido em {self.index_path}, recriando: {e}")
+            return {}
+        # Descartar entradas cujo arquivo sumiu do disco
+        return {key: entry for key, entry in entries.items() if os.path.exists(self.path_for(key))}
+
+    def path_for(self, key):
+        return os.path.join(self.root, key[:2], f"{key}{self.suffix}")
+
+    def total_bytes(self):
+        with self._lock:
+            return sum(entry["size"] for entry in self.entries.values())
+
+    def lookup(self, key):
+        """Retorna a entrada do índice (ou None) e contabiliza acerto/erro"""
+        with self._lock:
+            entry = self.entries.get(key)
+            if entry is None or not os.path.exists(self.path_for(key)):
+                self.entries.pop(key, None)
+                self.misses += 1
+                return None
+            entry["last_access"] = time.time()
+            self._dirty = True
+            self.hits += 1
+            return entry
+
+    def materialize(self, key, dest):
+        """Copia (via hardlink quando possível) o arquivo da chave para dest e retorna a entrada (None se não estiver no cache).
+
+        A busca e a cópia acontecem sob o mesmo lock, para um despejo concorrente não remover o arquivo no meio.
+        """
+        with self._lock:
+            entry = self.lookup(key)
+            if entry is not None:
+                link_or_copy(self.path_for(key), dest)
+            return entry
+
+    def read(self, key):
+        """Conteúdo do arquivo da chave, lido sob o lock (um despejo concorrente não o remove no meio); None se não estiver no cache"""
+        with self._lock:
+            if self.lookup(key) is None:
+                return None
+            with open(self.path_for(key), "rb") as f:
+                return f.read()
+
+    def put(self, key, src, meta=None):
+        """Armazena src sob a chave, aplica o limite de bytes e retorna o caminho no cache"""
+        path = self.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        shutil.copy2(src, tmp_path)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self.entries[key] = {
+                "size": os.path.getsize(path),
+                "last_access": time.time(),
+                "meta": meta or {}
+            }
+            self._dirty = True
+            self._removed.discard(key)
+            self._evict(keep=key)
+            if time.monotonic() - self._last_flush >= INDEX_FLUSH_INTERVAL_S:
+                self.flush()
+        return path
+
+    def _evict(self, keep=None):
+        if self.max_bytes is None:
+            return
+        total = sum(entry["size"] for entry in self.entries.values())
+        for key in sorted(self.entries, key=lambda k: self.entries[k]["last_access"]):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            total -= self.entries.pop(key)["size"]
+            self._removed.add(key)
+            self._dirty = True
+            try:
+                os.remove(self.path_for(key))
+            except FileNotFoundError:
+                pass
+            self.evictions += 1
+
+    def flush(self):
+        """Mescla as entradas com o índice em disco (de outros processos) e grava o resultado de forma atômica"""
+        with self._lock:
+            if not self._dirty:
+                return
+            with open(f"{self.index_path}.lock", "a") as lock_file:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_EX)
+                entries = {key: entry for key, entry in self._load_index().items() if key not in self._removed}
+                for key, entry in self.entries.items():
+                    if not os.path.exists(self.path_for(key)):
+                        continue  # Despejada por outro processo
+                    if key in entries:
+                        entry["last_access"] = max(entry["last_access"], entries[key]["last_access"])
+                    entries[key] = entry
+                self.entries = entries
+                self._evict()
+                tmp_path = f"{self.index_path}.{os.getpid()}.tmp"
+                with open(tmp_path, "w", encoding="utf-8") as f:
+                    json.dump({"entries": self.entries}, f)
+                os.replace(tmp_path, self.index_path)
+            self._removed.clear()
+            self._dirty = False
+            self._last_flush = time.monotonic()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self.entries),
+                "bytes": self.total_bytes(),
+                "max_bytes": self.max_bytes
+            }
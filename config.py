@@ -1,19 +1,104 @@
 import os
-import torch
+
+DEFAULT_INFERENCE_STEPS = 25
+DEFAULT_GUIDANCE_SCALE = 3.0
+
+# Qualidade "draft": revisão rápida do storyboard, com saída marcada para não sobrescrever o vídeo final
+QUALITY_TIERS = ("final", "draft")
+DRAFT_GEN_RESOLUTION = (512, 512)
+DRAFT_INFERENCE_STEPS = 8
+DRAFT_RESOLUTION_SCALE = 0.5
+DRAFT_FPS = 12
+DRAFT_ENCODER_PRESET = "ultrafast"
+DRAFT_ENCODER_CRF = 28
+DRAFT_BITRATE = "1500k"
+
+def default_device():
+    """cuda se disponível; o torch só é importado aqui (e não é obrigatório para renderizar)"""
+    try:
+        import torch
+    except ImportError:
+        return "cpu"
+    return "cuda" if torch.cuda.is_available() else "cpu"
 
 class VideoConfig:
-    def __init__(self, video_type, project_name, json_file_path, audio_path=None, voice="pm_alex", output_dir=None, lang_code='p', add_subtitles=False, enable_video_generation=False):
+    def __init__(self, video_type, project_name, json_file_path, audio_path=None, voice="pm_alex", output_dir=None, lang_code='p', add_subtitles=False, enable_video_generation=False, image_batch_size=None, tts_workers=1, pipeline_queue_size=8, seed=None, cache_dir=None, image_cache_max_bytes=20 * 1024 ** 3, tts_speed=1.0, audio_cache_max_bytes=2 * 1024 ** 3, output_backend="moviepy", encoder_crf=None, encoder_preset=None, encoder_threads=None, encoder_gop=None, render_mode="single", render_workers=None, segment_cache=True, subtitle_font=None, scene_effects=None, scheduler=None, num_inference_steps=DEFAULT_INFERENCE_STEPS, guidance_scale=DEFAULT_GUIDANCE_SCALE, quality="final"):
+        if quality not in QUALITY_TIERS:
+            raise ValueError(f"Qualidade desconhecida: {quality} (opções: {', '.join(QUALITY_TIERS)})")
         self.video_type = video_type.lower()
         self.gen_resolution = (1024, 1024)  # Resolução fixa para Playground V2.5
         self.final_resolution = (1080, 1920) if video_type == "short" else (1920, 1080)
+        self.fps = 24
         self.duration_min = 15 if video_type == "short" else 60
         self.duration_max = 60 if video_type == "short" else 600
         self.output_filename = f"{'short' if video_type == 'short' else 'video'}_{project_name.replace(' ', '_')}.mp4"
-        self.device = "cuda" if torch.cuda.is_available() else "cpu"
+        self._device = None  # Resolvido no primeiro acesso, para não importar o torch sem necessidade
         self.audio_path = audio_path if audio_path and os.path.exists(audio_path) else None
         self.voice = voice
         self.output_dir = output_dir or "narrative_output"
+        self.image_dir = self.output_dir  # Imagens das cenas (o rascunho usa uma subpasta, para não sobrescrever as finais)
         self.json_file_path = json_file_path
         self.lang_code = lang_code
         self.add_subtitles = add_subtitles
-        self.enable_video_generation = enable_video_generation  # Nova opção para habilitar geração de vídeo
\ No newline at end of file
+        self.enable_video_generation = enable_video_generation  # Nova opção para habilitar geração de vídeo
+        self.image_batch_size = image_batch_size  # Cenas por chamada do pipe (None = automático pela memória livre)
+        self.tts_workers = tts_workers  # Threads de narração do Kokoro rodando em paralelo à difusão
+        self.pipeline_queue_size = pipeline_queue_size  # Limite das filas entre os estágios de geração
+        self.seed = seed  # Seed global fixo (None = seed persistido em seed.txt na pasta do projeto)
+        self.cache_dir = cache_dir or "cache"  # Armazém global de assets endereçados por conteúdo
+        self.image_cache_max_bytes = image_cache_max_bytes  # Limite do cache de imagens antes do despejo LRU
+        self.tts_speed = tts_speed  # Velocidade da narração do Kokoro
+        self.audio_cache_max_bytes = audio_cache_max_bytes  # Limite do cache de narrações antes do despejo LRU
+        self.output_backend = output_backend  # "moviepy" (write_videofile) ou "ffmpeg" (frames enviados por pipe)
+        # Ajustes do encoder ffmpeg (None = padrão de acordo com os núcleos da máquina)
+        self.encoder_crf = encoder_crf
+        self.encoder_preset = encoder_preset
+        self.encoder_threads = encoder_threads
+        self.encoder_gop = encoder_gop
+        self.render_mode = render_mode  # "single" (um único composite) ou "segments" (uma cena por processo + concat)
+        self.render_workers = render_workers  # Processos de renderização no modo "segments" (None = núcleos da máquina)
+        self.segment_cache = segment_cache  # Reaproveita segmentos cujas entradas não mudaram (modo "segments")
+        self.subtitle_font = subtitle_font  # Fonte TrueType das legendas (None = Arial Bold/DejaVu Sans Bold)
+        # Efeitos das cenas, ex: [{"name": "color_grading", "style": "drama"}, {"name": "film_grain"}]
+        self.scene_effects = scene_effects or []
+        # Difusão: scheduler (None = o do checkpoint, ver models.SCHEDULERS), passos e guidance por vídeo
+        self.scheduler = scheduler
+        self.num_inference_steps = num_inference_steps
+        self.guidance_scale = guidance_scale
+        self.transitions = True  # False = cortes secos entre as cenas
+        self.bitrate = "5000k"  # Bitrate do backend moviepy
+        self.quality = quality
+        if quality == "draft":
+            self._apply_draft()
+
+    def _apply_draft(self):
+        """Reduz difusão, resolução, fps e encode; a narração (e seu cache) não muda"""
+        self.gen_resolution = DRAFT_GEN_RESOLUTION
+        self.num_inference_steps = min(self.num_inference_steps, DRAFT_INFERENCE_STEPS)
+        # Dimensões pares, exigidas pelo yuv420p
+        self.final_resolution = tuple(int(side * DRAFT_RESOLUTION_SCALE) // 2 * 2 for side in self.final_resolution)
+        self.fps = DRAFT_FPS
+        self.scene_effects = []
+        self.transitions = False
+        if self.encoder_preset is None:
+            self.encoder_preset = DRAFT_ENCODER_PRESET
+        if self.encoder_crf is None:  # crf 0 (sem perdas) pedido explicitamente é mantido
+            self.encoder_crf = DRAFT_ENCODER_CRF
+        self.bitrate = DRAFT_BITRATE
+        self.output_filename = os.path.splitext(self.output_filename)[0] + "_draft.mp4"
+        self.image_dir = os.path.join(self.output_dir, "draft")
+
+    @property
+    def file_suffix(self):
+        """Sufixo dos arquivos do projeto (manifesto, storyboard) que dependem da qualidade"""
+        return "_draft" if self.quality == "draft" else ""
+
+    @property
+    def device(self):
+        if self._device is None:
+            self._device = default_device()
+        return self._device
+
+    @device.setter
+    def device(self, value):
+        self._device = value
@@ -1,15 +1,52 @@
 import os
-import torch
 import json
 from PIL import Image
-from moviepy.editor import AudioFileClip
+import numpy as np
 import soundfile as sf
 from tqdm import tqdm
+import sys
 import random
-from diffusers import DiffusionPipeline
+import time
+import queue
+import threading
+import importlib.metadata
+import logging
+from cache import AssetCache, make_cache_key
+import metrics
+from models import apply_scheduler, inference_steps
+
+logger = logging.getLogger(__name__)
+
+def save_content_manifest(content_data, manifest_path, **info):
+    """Grava as cenas geradas (imagem, narração, duração, texto) para renderizar em outro processo"""
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    scenes = [
+        dict(item, image_path=os.path.relpath(item["image_path"], base_dir), audio_path=os.path.relpath(item["audio_path"], base_dir))
+        for item in content_data
+    ]
+    with open(manifest_path, "w", encoding="utf-8") as f:
+        json.dump(dict(info, scenes=scenes), f, ensure_ascii=False, indent=2)
+    return manifest_path
+
+def load_content_manifest(manifest_path):
+    """Lê um manifesto de cenas; retorna (content_data, informações do projeto)"""
+    with open(manifest_path, "r", encoding="utf-8") as f:
+        data = json.load(f)
+    base_dir = os.path.dirname(os.path.abspath(manifest_path))
+    content_data = []
+    for i, item in enumerate(data.pop("scenes", [])):
+        item = dict(item, image_path=os.path.join(base_dir, item["image_path"]), audio_path=os.path.join(base_dir, item["audio_path"]))
+        for key in ("image_path", "audio_path"):
+            if not os.path.exists(item[key]):
+                raise FileNotFoundError(f"Cena {i+1}: arquivo não encontrado: {item[key]}")
+        content_data.append(item)
+    if not content_data:
+        raise ValueError("Nenhuma cena encontrada no manifesto.")
+    return content_data, data
 
 def clear_gpu_memory():
-    if torch.cuda.is_available():
+    torch = sys.modules.get("torch")  # Sem torch carregado não há memória de GPU para liberar
+    if torch is not None and torch.cuda.is_available():
         torch.cuda.empty_cache()
 
 def process_json_prompts(json_file_path):
@@ -28,46 +65,304 @@ def process_json_prompts(json_file_path):
         prompt["style"] = prompt.get("style", "cinematic, high quality")
     return prompts
 
+NEGATIVE_PROMPT = "blurry, low quality, bad anatomy"
+VRAM_POR_IMAGEM = 1.5 * 1024 ** 3  # Estimativa de pico por imagem 1024x1024 em float16 (com CFG)
+MAX_BATCH_IMAGENS = 8
+KOKORO_SAMPLE_RATE = 24000
+STAGE_QUEUE_TIMEOUT = 0.1  # Intervalo (s) em que os estágios bloqueados verificam o sinal de parada
+
+def is_oom_error(exc):
+    """Verifica se a exceção é falta de memória na GPU"""
+    import torch
+    oom_type = getattr(torch.cuda, "OutOfMemoryError", None)
+    if oom_type is not None and isinstance(exc, oom_type):
+        return True
+    return isinstance(exc, RuntimeError) and "out of memory" in str(exc).lower()
+
+def auto_image_batch_size(config, width, height):
+    """Estima quantas cenas cabem em um único passo do UNet a partir da memória livre"""
+    import torch
+    if config.device != "cuda" or not torch.cuda.is_available():
+        return 1
+    free_bytes, _ = torch.cuda.mem_get_info()
+    per_image = VRAM_POR_IMAGEM * (width * height) / (1024 * 1024)
+    return max(1, min(MAX_BATCH_IMAGENS, int(free_bytes * 0.8 // per_image)))
+
+def generate_images_batched(pipe, jobs, config, global_seed, width, height, batch_size, on_image=None, stop=None):
+    """Gera as imagens em lotes de várias cenas por chamada do pipe.
+
+    jobs é uma lista de (idx, full_prompt, image_path). Cada cena usa o seed
+    global_seed + idx, então o resultado é o mesmo do caminho sem lote. Em caso
+    de falta de memória o lote é reduzido pela metade e a chamada é repetida.
+    on_image(idx) é chamado assim que cada imagem é salva; com stop (Event)
+    definido, a geração para antes do próximo lote.
+    """
+    import torch
+    progress = tqdm(total=len(jobs), desc="Gerando imagens")
+    start = 0
+    while start < len(jobs):
+        if stop is not None and stop.is_set():
+            break
+        chunk = jobs[start:start + batch_size]
+        batch_start = time.perf_counter()
+        try:
+            images = pipe(
+                prompt=[prompt for _, prompt, _ in chunk],
+                negative_prompt=[NEGATIVE_PROMPT] * len(chunk),
+                width=width,
+                height=height,
+                num_inference_steps=config.num_inference_steps,
+                guidance_scale=config.guidance_scale,
+                generator=[torch.Generator(config.device).manual_seed(global_seed + idx) for idx, _, _ in chunk]
+            ).images
+        except Exception as e:
+            if not is_oom_error(e) or batch_size == 1:
+                raise
+            batch_size = max(1, batch_size // 2)
+            print(f"[AVISO] Memória insuficiente, reduzindo lote para {batch_size} cena(s).")
+            clear_gpu_memory()
+            continue
+        batch_time = time.perf_counter() - batch_start
+        run_metrics = metrics.get_metrics()
+        run_metrics.record("difusao_lote", batch_time, cenas=[idx for idx, _, _ in chunk])
+        for idx, _, _ in chunk:
+            # Tempo de difusão por cena: o lote é dividido igualmente entre as cenas
+            run_metrics.record("difusao_cena", batch_time / len(chunk), cena=idx, lote=len(chunk))
+        for (idx, _, image_path), image in zip(chunk, images):
+            # Remover antes de salvar para não sobrescrever um hardlink do cache
+            if os.path.lexists(image_path):
+                os.remove(image_path)
+            image.save(image_path)
+            if on_image is not None:
+                on_image(idx)
+        start += len(chunk)
+        progress.update(len(chunk))
+        clear_gpu_memory()
+    progress.close()
+
+def project_seed(config):
+    """Retorna o seed global do projeto, persistido para que novas execuções reutilizem o cache"""
+    if config.seed is not None:
+        return config.seed
+    seed_path = os.path.join(config.output_dir, "seed.txt")
+    if os.path.exists(seed_path):
+        with open(seed_path, "r", encoding="utf-8") as f:
+            return int(f.read().strip())
+    seed = random.randint(1, 2147483647)
+    with open(seed_path, "w", encoding="utf-8") as f:
+        f.write(str(seed))
+    return seed
+
+def image_cache_key(pipe, item, seed, width, height, config):
+    """Chave de conteúdo de uma imagem gerada"""
+    scheduler = getattr(pipe, "scheduler", None)
+    dtype = getattr(pipe, "dtype", None)
+    return make_cache_key(
+        model=getattr(pipe, "name_or_path", None) or type(pipe).__name__,
+        # CPU float32 e GPU fp16 geram pixels diferentes para o mesmo seed
+        device=config.device,
+        dtype=str(dtype) if dtype is not None else None,
+        prompt=f"{item['prompt_image']}, {item['style']}",
+        style=item["style"],
+        negative_prompt=NEGATIVE_PROMPT,
+        steps=config.num_inference_steps,
+        guidance=config.guidance_scale,
+        scheduler=type(scheduler).__name__ if scheduler is not None else None,
+        resolution=[width, height],
+        seed=seed
+    )
+
+def narration_cache_key(kokoro_pipeline, text, config):
+    """Chave de conteúdo de uma narração do Kokoro"""
+    try:
+        model_version = importlib.metadata.version("kokoro")
+    except importlib.metadata.PackageNotFoundError:
+        model_version = "unknown"
+    return make_cache_key(
+        text=text,
+        voice=config.voice,
+        lang_code=config.lang_code,
+        speed=config.tts_speed,
+        model=getattr(kokoro_pipeline, "repo_id", None),
+        model_version=model_version
+    )
+
+def write_narration(kokoro_pipeline, text, audio_path, config):
+    """Grava todos os segmentos gerados pelo Kokoro em um único WAV, sem acumular o áudio em memória"""
+    frames = 0
+    with sf.SoundFile(audio_path, "w", samplerate=KOKORO_SAMPLE_RATE, channels=1, subtype="PCM_16") as wav:
+        for gs, ps, audio in kokoro_pipeline(text, voice=config.voice, speed=config.tts_speed):
+            if audio is None:
+                continue
+            chunk = np.asarray(audio, dtype=np.float32).reshape(-1)
+            wav.write(chunk)
+            frames += len(chunk)
+    return frames / KOKORO_SAMPLE_RATE
+
+def narrate_scene(kokoro_pipeline, item, config, audio_cache):
+    """Gera (ou reaproveita do cache) a narração de uma cena e retorna (caminho do WAV, duração)"""
+    audio_path = os.path.join(config.output_dir, item["audio_filename"])
+    key = narration_cache_key(kokoro_pipeline, item["prompt_audio"], config)
+    entry = audio_cache.materialize(key, audio_path)
+    if entry is not None:
+        metrics.count("cache_narracao_hits")
+        return audio_path, entry["meta"]["duration"]
+    metrics.count("cache_narracao_misses")
+    # Remover antes de gravar para não sobrescrever um hardlink do cache
+    if os.path.lexists(audio_path):
+        os.remove(audio_path)
+    with metrics.span("tts_cena", arquivo=item["audio_filename"]) as span:
+        duration = write_narration(kokoro_pipeline, item["prompt_audio"], audio_path, config)
+        span["duracao_audio_s"] = duration
+    audio_cache.put(key, audio_path, meta={"duration": duration, "text": item["prompt_audio"]})
+    return audio_path, duration
+
+def _put(q, item, stop):
+    """put em uma fila limitada que desiste quando stop é sinalizado (retorna False)"""
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=STAGE_QUEUE_TIMEOUT)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+def _run_stage(target, events, stop):
+    """Executa um estágio do pipeline e repassa qualquer erro para a thread principal"""
+    def run():
+        try:
+            target()
+        except BaseException as e:
+            _put(events, ("error", e), stop)
+    thread = threading.Thread(target=run, daemon=True)
+    thread.start()
+    return thread
+
+def _stop_stages(threads, stop, queues):
+    """Sinaliza o fim aos estágios e espera todos terminarem, esvaziando as filas para desbloqueá-los.
+
+    A chamada do pipe em andamento não é interrompida: o retorno só acontece
+    depois dela, então nenhuma thread continua usando a GPU no próximo job.
+    """
+    stop.set()
+    for thread in threads:
+        while thread.is_alive():
+            for q in queues:
+                try:
+                    while True:
+                        q.get_nowait()
+                except queue.Empty:
+                    pass
+            thread.join(timeout=STAGE_QUEUE_TIMEOUT)
+
 def generate_content(pipe, kokoro_pipeline, prompts, config):
+    """Gera imagens e narrações em estágios paralelos.
+
+    Um worker roda a difusão enquanto um pool separado sintetiza as narrações
+    com o Kokoro; os dois se comunicam com a thread principal por filas
+    limitadas. O resultado mantém a ordem das cenas.
+    """
     os.makedirs(config.output_dir, exist_ok=True)
-    content_data = []
-    global_seed = random.randint(1, 2147483647)
+    os.makedirs(config.image_dir, exist_ok=True)
+    global_seed = project_seed(config)
+    image_cache = AssetCache(os.path.join(config.cache_dir, "images"), config.image_cache_max_bytes, suffix=".png")
+    audio_cache = AssetCache(os.path.join(config.cache_dir, "narration"), config.audio_cache_max_bytes, suffix=".wav")
     
-    gen_width, gen_height = 1024, 1024
-    print(f"[INFO] Usando resolução {gen_width}x{gen_height} para Playground V2.5. Ajuste final será feito no vídeo.")
-
-    for idx, item in enumerate(tqdm(prompts, desc="Gerando conteúdo")):
-        full_prompt = f"{item['prompt_image']}, {item['style']}"
-        image_path = os.path.join(config.output_dir, item["filename"])
-        
-        if not os.path.exists(image_path):
-            generator = torch.Generator(config.device).manual_seed(global_seed + idx)
-            image = pipe(
-                prompt=full_prompt,
-                negative_prompt="blurry, low quality, bad anatomy",
-                width=gen_width,
-                height=gen_height,
-                num_inference_steps=25,
-                guidance_scale=3.0,
-                generator=generator
-            ).images[0]
-            image.save(image_path)
+    gen_width, gen_height = config.gen_resolution
+    print(f"[INFO] Usando resolução {gen_width}x{gen_height} para a difusão. Ajuste final será feito no vídeo.")
+    # Scheduler do vídeo aplicado antes das chaves do cache, que dependem dele
+    apply_scheduler(pipe, config.scheduler)
+    steps = inference_steps(pipe, config.num_inference_steps)
+    if steps != config.num_inference_steps:
+        print(f"[INFO] Perfil de CPU: passos reduzidos de {config.num_inference_steps} para {steps}.")
+        config.num_inference_steps = steps
+    print(f"[INFO] Difusão: {config.num_inference_steps} passos, guidance {config.guidance_scale}, scheduler {config.scheduler or 'padrão'}.")
 
-        audio_path = os.path.join(config.output_dir, item["audio_filename"])
-        if not os.path.exists(audio_path):
-            voice = config.voice
-            generator = kokoro_pipeline(item["prompt_audio"], voice=voice)
-            for i, (gs, ps, audio) in enumerate(generator):
-                sf.write(audio_path, audio, 24000)
-                break
-
-        audio_clip = AudioFileClip(audio_path)
-        content_data.append({
-            "image_path": image_path,
-            "audio_path": audio_path,
-            "duration": audio_clip.duration,
-            "prompt": item["prompt_audio"],
-            "audio_clip": audio_clip
-        })
-        clear_gpu_memory()
+    jobs = []
+    image_keys = {}
+    for idx, item in enumerate(prompts):
+        image_path = os.path.join(config.image_dir, item["filename"])
+        image_keys[idx] = image_cache_key(pipe, item, global_seed + idx, gen_width, gen_height, config)
+        if not image_cache.materialize(image_keys[idx], image_path):
+            jobs.append((idx, f"{item['prompt_image']}, {item['style']}", image_path))
+    jobs_by_idx = {idx: (full_prompt, image_path) for idx, full_prompt, image_path in jobs}
+    print(f"[INFO] Cache de imagens: {len(prompts) - len(jobs)} de {len(prompts)} cena(s) reaproveitadas.")
+    metrics.count("cache_imagens_hits", len(prompts) - len(jobs))
+    metrics.count("cache_imagens_misses", len(jobs))
+
+    events = queue.Queue(maxsize=config.pipeline_queue_size)
+    stop = threading.Event()  # Sinalizado em caso de erro para os estágios pararem
+
+    def on_image(idx):
+        full_prompt, image_path = jobs_by_idx[idx]
+        image_cache.put(image_keys[idx], image_path, meta={"prompt": full_prompt})
+        _put(events, ("image", idx, None), stop)
+    scenes = queue.Queue(maxsize=config.pipeline_queue_size)
+    tts_workers = max(1, config.tts_workers)
+
+    def image_stage():
+        if not jobs:
+            return
+        batch_size = config.image_batch_size or auto_image_batch_size(config, gen_width, gen_height)
+        print(f"[INFO] Gerando {len(jobs)} imagem(ns) em lotes de até {batch_size} cena(s).")
+        generate_images_batched(
+            pipe, jobs, config, global_seed, gen_width, gen_height, batch_size,
+            on_image=on_image, stop=stop
+        )
+
+    def feed_stage():
+        for idx in range(len(prompts)):
+            if not _put(scenes, idx, stop):
+                return
+        for _ in range(tts_workers):
+            _put(scenes, None, stop)
+
+    def narration_stage():
+        while not stop.is_set():
+            try:
+                idx = scenes.get(timeout=STAGE_QUEUE_TIMEOUT)
+            except queue.Empty:
+                continue
+            if idx is None:
+                return
+            _put(events, ("audio", idx, narrate_scene(kokoro_pipeline, prompts[idx], config, audio_cache)), stop)
+
+    threads = [_run_stage(image_stage, events, stop), _run_stage(feed_stage, events, stop)]
+    for _ in range(tts_workers):
+        threads.append(_run_stage(narration_stage, events, stop))
+
+    pending_images = set(jobs_by_idx)
+    narrations = {}
+    content_data = [None] * len(prompts)
+    progress = tqdm(total=len(prompts), desc="Gerando conteúdo")
+    try:
+        while progress.n < len(prompts):
+            kind, idx, *payload = events.get()
+            if kind == "error":
+                raise idx
+            if kind == "image":
+                pending_images.discard(idx)
+            else:
+                narrations[idx] = payload[0]
+            ready = [i for i in list(narrations) if i not in pending_images]
+            for i in ready:
+                audio_path, duration = narrations.pop(i)
+                content_data[i] = {
+                    "image_path": os.path.join(config.image_dir, prompts[i]["filename"]),
+                    "audio_path": audio_path,
+                    "duration": duration,
+                    "prompt": prompts[i]["prompt_audio"]
+                }
+                progress.update(1)
+    except BaseException:
+        # Nenhum estágio pode continuar com o pipe ou o Kokoro depois do retorno (lote e servidor reutilizam os modelos)
+        _stop_stages(threads, stop, [events, scenes])
+        raise
+    finally:
+        progress.close()
+        # Também em caso de erro, para o índice não perder as entradas já geradas
+        image_cache.flush()
+        audio_cache.flush()
+    logger.info(f"Estatísticas do cache de imagens: {image_cache.stats()}")
+    logger.info(f"Estatísticas do cache de narração: {audio_cache.stats()}")
     return content_data
\ No newline at end of file
@@ -0,0 +1,132 @@
+import os
+import subprocess
+import tempfile
+import logging
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+def ffmpeg_binary():
+    """Retorna o executável do ffmpeg usado pelo moviepy (ou o do PATH)"""
+    try:
+        from moviepy.config import get_setting
+        return get_setting("FFMPEG_BINARY")
+    except Exception:
+        pass
+    try:
+        import imageio_ffmpeg
+        return imageio_ffmpeg.get_ffmpeg_exe()
+    except Exception:
+        return "ffmpeg"
+
+def default_encoder_settings(fps, cpu_count=None):
+    """Valores padrão de CRF/preset/threads/GOP de acordo com o número de núcleos da máquina"""
+    cpu_count = cpu_count or os.cpu_count() or 1
+    if cpu_count <= 4:
+        preset = "veryfast"
+    elif cpu_count <= 8:
+        preset = "faster"
+    else:
+        preset = "medium"
+    return {"crf": 20, "preset": preset, "threads": cpu_count, "gop": int(round(fps * 2))}
+
+def encoder_settings(config):
+    """Combina os valores do VideoConfig com os padrões da máquina"""
+    settings = default_encoder_settings(config.fps)
+    overrides = {
+        "crf": config.encoder_crf,
+        "preset": config.encoder_preset,
+        "threads": config.encoder_threads,
+        "gop": config.encoder_gop
+    }
+    settings.update({key: value for key, value in overrides.items() if value is not None})
+    return settings
+
+def iter_clip_frames(clip, fps):
+    """Gera os frames de um clipe em sequência, sem cópias intermediárias"""
+    n_frames = int(round(clip.duration * fps))
+    for n in range(n_frames):
+        yield clip.get_frame(n / fps)
+
+def encode_audio_track(source_path, output_path, bitrate="192k"):
+    """Codifica um áudio (ex: WAV) em AAC uma única vez para depois ser copiado no mux"""
+    cmd = [
+        ffmpeg_binary(), "-y", "-loglevel", "error",
+        "-i", source_path, "-vn", "-c:a", "aac", "-b:a", bitrate, output_path
+    ]
+    subprocess.run(cmd, check=True)
+    return output_path
+
+class FFmpegPipeWriter:
+    """Envia frames RGB brutos para um processo ffmpeg por pipe e codifica em H.264.
+
+    Se audio_path for informado (AAC/M4A já codificado), a faixa é multiplexada
+    com cópia de stream, sem recodificação.
+    """
+
+    def __init__(self, output_path, size, fps, audio_path=None, crf=20, preset="veryfast", threads=None, gop=None, pix_fmt="yuv420p"):
+        self.output_path = output_path
+        self.width, self.height = size
+        self.frame_bytes = self.width * self.height * 3
+        cmd = [
+            ffmpeg_binary(), "-y", "-loglevel", "error",
+            "-f", "rawvideo", "-vcodec", "rawvideo", "-pix_fmt", "rgb24",
+            "-s", f"{self.width}x{self.height}", "-r", f"{fps}", "-i", "-"
+        ]
+        if audio_path:
+            cmd += ["-i", audio_path, "-map", "0:v", "-map", "1:a", "-c:a", "copy", "-shortest"]
+        else:
+            cmd += ["-an"]
+        cmd += [
+            "-c:v", "libx264", "-preset", preset, "-crf", str(crf),
+            "-pix_fmt", pix_fmt, "-movflags", "+faststart"
+        ]
+        if gop:
+            cmd += ["-g", str(gop)]
+        if threads:
+            cmd += ["-threads", str(threads)]
+        cmd.append(output_path)
+        logger.info(f"Iniciando encoder ffmpeg: {' '.join(cmd)}")
+        self._stderr = tempfile.TemporaryFile()
+        self.proc = subprocess.Popen(cmd, stdin=subprocess.PIPE, stderr=self._stderr)
+        self.frames_written = 0
+
+    def write_frame(self, frame):
+        if frame.dtype != np.uint8:
+            frame = np.clip(frame, 0, 255).astype(np.uint8)
+        frame = np.ascontiguousarray(frame)
+        if frame.nbytes != self.frame_bytes:
+            raise ValueError(f"Frame com tamanho {frame.shape} diferente de {self.width}x{self.height}")
+        try:
+            self.proc.stdin.write(memoryview(frame).cast("B"))
+        except BrokenPipeError:
+            self.close()
+            raise
+        self.frames_written += 1
+
+    def write_frames(self, frames):
+        for frame in frames:
+            self.write_frame(frame)
+
+    def close(self):
+        if self.proc.stdin and not self.proc.stdin.closed:
+            self.proc.stdin.close()
+        returncode = self.proc.wait()
+        self._stderr.seek(0)
+        errors = self._stderr.read().decode("utf-8", errors="replace").strip()
+        self._stderr.close()
+        if returncode != 0:
+            raise RuntimeError(f"ffmpeg falhou ao gerar {self.output_path} (código {returncode}): {errors}")
+        return self.output_path
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.proc.kill()
+            self.proc.wait()
+            self._stderr.close()
+        return False
@@ -1,19 +1,32 @@
-from config import VideoConfig
-from models import load_models
-from content import process_json_prompts, generate_content, clear_gpu_memory
-from video import create_narrative_video
+from config import VideoConfig, DEFAULT_INFERENCE_STEPS, DEFAULT_GUIDANCE_SCALE, QUALITY_TIERS
 import json
-from groq import Groq
+import metrics
 import logging
 import os
+import sys
+import time
+import argparse
+import functools
+from collections import deque
+from storyboard_client import StoryboardClient, make_backend, STORYBOARD_BACKEND
 
 # Configurar logging
 logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
 logger = logging.getLogger(__name__)
 
-# Configurar o cliente Grok
-API_KEY = "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"
-client = Groq(api_key=API_KEY)
+# Cliente do storyboard: backend (Groq, servidor local ou fixture), cache em disco,
+# novas tentativas e limite de concorrência ficam em storyboard_client.py
+API_KEY = os.environ.get("GROQ_API_KEY")
+_storyboard_client = None
+
+def get_storyboard_client():
+    global _storyboard_client
+    if _storyboard_client is None:
+        _storyboard_client = StoryboardClient(make_backend(STORYBOARD_BACKEND, api_key=API_KEY))
+    return _storyboard_client
+
+# Coletor local opcional que recebe cada span de métricas por HTTP (ex: http://localhost:4318/spans)
+METRICS_COLLECTOR_URL = os.environ.get("METRICS_COLLECTOR_URL")
 
 # Mapeamento de idiomas e vozes disponíveis
 IDIOMAS = {
@@ -101,20 +114,26 @@ def aplicar_consistencia(storyboard):
     
     return storyboard
 
+def processar_storyboard(resposta):
+    return aplicar_consistencia(json.loads(resposta))
+
 def gerar_storyboard_grok(historia, num_cenas, estilo, tipo, lang_code='p'):
-    """Gera um storyboard ultra-consistente com o Grok"""
-    logger.info("Chamando a API do Grok para gerar o storyboard...")
+    """Gera um storyboard ultra-consistente com o LLM (pedidos repetidos vêm do cache)"""
+    logger.info("Chamando o LLM para gerar o storyboard...")
     prompt = gerar_prompt(historia, num_cenas, estilo, tipo, lang_code)
-    resposta = client.chat.completions.create(
-        messages=[{"role": "user", "content": prompt}],
-        model="meta-llama/llama-4-scout-17b-16e-instruct",
-        response_format={"type": "json_object"},
-        temperature=0.3
-    ).choices[0].message.content
-    storyboard = aplicar_consistencia(json.loads(resposta))
+    storyboard = get_storyboard_client().complete(prompt, parse=processar_storyboard)
     logger.info("Storyboard gerado com sucesso.")
     return storyboard
 
+def solicitar_storyboard(job):
+    """Pede o storyboard de um job normalizado em segundo plano (Future).
+
+    A resposta vai para o cache, então o gerar_storyboard_grok do job
+    encontra o storyboard pronto (ou espera pela mesma chamada).
+    """
+    prompt = gerar_prompt(job["story"], job["scenes"], job["style"], job["type"], job["lang_code"])
+    return get_storyboard_client().submit(prompt, parse=processar_storyboard)
+
 def criar_pasta_projeto(project_name):
     """Cria uma pasta para o projeto e retorna o caminho"""
     pasta_projeto = os.path.join("projetos", project_name)
@@ -122,6 +141,96 @@ def criar_pasta_projeto(project_name):
     logger.info(f"Pasta do projeto criada em: {pasta_projeto}")
     return pasta_projeto
 
+def normalizar_job(job):
+    """Valida uma especificação de vídeo e preenche os padrões do modo interativo"""
+    if not str(job.get("story", "")).strip():
+        raise ValueError("Job sem 'story' (tema/narrativa)")
+    lang_code = str(job.get("lang_code", "p")).lower()
+    if lang_code not in IDIOMAS:
+        logger.warning(f"Idioma '{lang_code}' não suportado. Usando português (p) como padrão.")
+        lang_code = 'p'
+    vozes = IDIOMAS[lang_code]['vozes']
+    voice = job.get("voice") or vozes[0]
+    if voice not in vozes:
+        logger.warning(f"Voz '{voice}' não disponível. Usando {vozes[0]} como padrão.")
+        voice = vozes[0]
+    num_cenas = int(job.get("scenes", 5))
+    if num_cenas < 1:
+        raise ValueError("'scenes' deve ser pelo menos 1")
+    project_name = str(job.get("project") or job.get("id") or "projeto").replace(" ", "_")
+    steps = int(job.get("steps", DEFAULT_INFERENCE_STEPS))
+    if steps < 1:
+        raise ValueError("'steps' deve ser pelo menos 1")
+    scheduler = job.get("scheduler")
+    if scheduler:
+        from models import SCHEDULERS
+        if scheduler not in SCHEDULERS:
+            raise ValueError(f"Scheduler '{scheduler}' desconhecido. Opções: {', '.join(sorted(SCHEDULERS))}")
+    quality = str(job.get("quality", "final")).lower()
+    if quality not in QUALITY_TIERS:
+        raise ValueError(f"Qualidade '{quality}' desconhecida. Opções: {', '.join(QUALITY_TIERS)}")
+    return {
+        "id": job.get("id", project_name),
+        "project": project_name,
+        "story": str(job["story"]).strip(),
+        "scenes": num_cenas,
+        "style": job.get("style") or "cinematic",
+        "type": str(job.get("type", "short")).lower(),
+        "lang_code": lang_code,
+        "voice": voice,
+        "music": job.get("music"),
+        "subtitles": bool(job.get("subtitles", False)),
+        "video_generation": bool(job.get("video_generation", False)),
+        "scheduler": scheduler or None,
+        "steps": steps,
+        "guidance": float(job.get("guidance", DEFAULT_GUIDANCE_SCALE)),
+        "quality": quality
+    }
+
+def executar_job(pipe, kokoro_pipeline, job):
+    """Gera um vídeo narrativo a partir de uma especificação já normalizada (sem interação)"""
+    from content import process_json_prompts, generate_content
+    from video import create_narrative_video
+    project_name = job["project"]
+    video_type = job["type"]
+    lang_code = job["lang_code"]
+    
+    # Criar pasta para o projeto
+    pasta_projeto = criar_pasta_projeto(project_name)
+    config = VideoConfig(video_type, project_name, None, job["music"], job["voice"], output_dir=pasta_projeto, lang_code=lang_code, add_subtitles=job["subtitles"], enable_video_generation=job["video_generation"], scheduler=job["scheduler"], num_inference_steps=job["steps"], guidance_scale=job["guidance"], quality=job["quality"])
+    # Rascunhos gravam o storyboard à parte, para não trocar o do vídeo final
+    config.json_file_path = os.path.join(pasta_projeto, f"{project_name}_prompts{config.file_suffix}.json")
+    json_file_path = config.json_file_path
+    logger.info(f"Configuração de legendas no VideoConfig: {config.add_subtitles}")
+    
+    # Relatório de métricas (JSON) gravado ao lado do vídeo, mesmo se a execução falhar
+    output_path = os.path.join(config.output_dir, config.output_filename)
+    run_metrics = metrics.start_run(project_name, collector_url=METRICS_COLLECTOR_URL)
+    run_metrics.set("cenas", job["scenes"])
+    run_metrics.set("tipo", video_type)
+    run_metrics.set("resolucao", list(config.final_resolution))
+    try:
+        logger.info("Iniciando geração do storyboard...")
+        print("\n⏳ Gerando storyboard ultra-consistente com Grok...")
+        with metrics.span("storyboard"):
+            json_data = gerar_storyboard_grok(job["story"], job["scenes"], job["style"], video_type, lang_code)
+        with open(json_file_path, "w", encoding="utf-8") as f:
+            json.dump(json_data, f, ensure_ascii=False, indent=2)
+        logger.info(f"JSON salvo em: {json_file_path}")
+        print(f"JSON gerado e salvo em: {json_file_path}")
+
+        logger.info("Iniciando o gerador de vídeo narrativo...")
+        print("Iniciando gerador de vídeo narrativo...")
+        prompts = process_json_prompts(config.json_file_path)
+        with metrics.span("geracao", cenas=len(prompts)):
+            content_data = generate_content(pipe, kokoro_pipeline, prompts, config)
+        with metrics.span("video", cenas=len(content_data)):
+            output_path = create_narrative_video(config, content_data)
+    finally:
+        metrics.finish_run(metrics.report_path_for(output_path))
+    logger.info(f"Vídeo narrativo concluído e salvo em: {output_path}")
+    return output_path
+
 def gerar_video(pipe, kokoro_pipeline):
     """Função para gerar um vídeo narrativo com ordem de inputs ajustada"""
     print("\n=== Novo Vídeo ===")
@@ -158,30 +267,101 @@ def gerar_video(pipe, kokoro_pipeline):
     enable_video = input("Habilitar geração de vídeos dinâmicos? (sim/não): ").lower() in ["sim", "s"]
     logger.info(f"Opção de geração de vídeo escolhida: {enable_video}")
     
-    # Criar pasta para o projeto
-    pasta_projeto = criar_pasta_projeto(project_name)
-    json_file_path = os.path.join(pasta_projeto, f"{project_name}_prompts.json")
-    
-    logger.info("Iniciando geração do storyboard...")
-    print("\n⏳ Gerando storyboard ultra-consistente com Grok...")
-    json_data = gerar_storyboard_grok(historia, num_cenas, estilo, video_type, lang_code)
-    with open(json_file_path, "w", encoding="utf-8") as f:
-        json.dump(json_data, f, ensure_ascii=False, indent=2)
-    logger.info(f"JSON salvo em: {json_file_path}")
-    print(f"JSON gerado e salvo em: {json_file_path}")
-
-    logger.info("Iniciando o gerador de vídeo narrativo...")
-    print("Iniciando gerador de vídeo narrativo...")
-    config = VideoConfig(video_type, project_name, json_file_path, audio_path, voice, output_dir=pasta_projeto, lang_code=lang_code, add_subtitles=add_subtitles, enable_video_generation=enable_video)
-    logger.info(f"Configuração de legendas no VideoConfig: {config.add_subtitles}")
-    prompts = process_json_prompts(config.json_file_path)
-    content_data = generate_content(pipe, kokoro_pipeline, prompts, config)
-    output_path = create_narrative_video(config, content_data)
-    logger.info(f"Vídeo narrativo concluído e salvo em: {output_path}")
+    job = normalizar_job({
+        "project": project_name, "story": historia, "scenes": num_cenas, "style": estilo, "type": video_type,
+        "lang_code": lang_code, "voice": voice, "music": audio_path, "subtitles": add_subtitles,
+        "video_generation": enable_video
+    })
+    if getattr(kokoro_pipeline, "lang_code", lang_code) != lang_code:
+        # Outro idioma: pipeline do pool do Kokoro, sem recarregar o modelo de difusão
+        from models import load_kokoro
+        kokoro_pipeline = load_kokoro(lang_code, voice)
+    output_path = executar_job(pipe, kokoro_pipeline, job)
     print(f"✅ História narrativa concluída! Vídeo salvo em: {output_path}")
     return output_path
 
+def ler_jobs(jobs_path):
+    """Lê as especificações de vídeo de um JSONL (ou da entrada padrão com '-'); linhas inválidas viram erro do job"""
+    stream = sys.stdin if jobs_path == "-" else open(jobs_path, "r", encoding="utf-8")
+    try:
+        for numero, linha in enumerate(stream, start=1):
+            linha = linha.strip()
+            if not linha or linha.startswith("#"):
+                continue
+            try:
+                yield numero, json.loads(linha), None
+            except json.JSONDecodeError as e:
+                yield numero, None, f"JSON inválido na linha {numero}: {e}"
+    finally:
+        if stream is not sys.stdin:
+            stream.close()
+
+def antecipar_storyboards(entradas, janela):
+    """Percorre os jobs lidos pedindo os storyboards dos próximos em segundo plano.
+
+    Enquanto um job usa a GPU, o LLM já trabalha nos storyboards dos próximos
+    (até janela jobs à frente), então o lote não espera pela latência do LLM.
+    """
+    pendentes = deque()
+    for entrada in entradas:
+        pendentes.append(entrada)
+        _, spec, erro = entrada
+        if not erro:
+            try:
+                solicitar_storyboard(normalizar_job(spec))
+            except Exception:
+                pass  # O erro aparece quando o job rodar
+        if len(pendentes) > janela:
+            yield pendentes.popleft()
+    while pendentes:
+        yield pendentes.popleft()
+
+def executar_lote(jobs_path, results_path, pipe=None, kokoro_pipeline=None, loader=None, janela_storyboards=None):
+    """Processa os jobs em sequência com os modelos carregados uma única vez.
+
+    Cada job é isolado: uma falha vira uma linha com status "erro" no JSONL de
+    resultados e o lote continua. O Kokoro de cada idioma vem do pool (modelo
+    acústico compartilhado), então filas com idiomas misturados não recarregam nada.
+    Os storyboards dos próximos jobs são pedidos antes, em paralelo.
+    """
+    from models import load_models, load_kokoro
+    from content import clear_gpu_memory
+    loader = loader or load_models
+    janela = get_storyboard_client().max_concurrency if janela_storyboards is None else janela_storyboards
+    resumo = {"ok": 0, "erro": 0}
+    with open(results_path, "a", encoding="utf-8") as results:
+        for numero, spec, erro in antecipar_storyboards(ler_jobs(jobs_path), janela):
+            inicio = time.perf_counter()
+            resultado = {"linha": numero, "id": (spec or {}).get("id", f"linha_{numero}")}
+            try:
+                if erro:
+                    raise ValueError(erro)
+                job = normalizar_job(spec)
+                resultado["id"] = job["id"]
+                if pipe is None:
+                    pipe, kokoro_pipeline = loader(job["lang_code"])
+                else:
+                    kokoro_pipeline = load_kokoro(job["lang_code"], job["voice"])
+                print(f"\n=== Job {resultado['id']} (linha {numero}) ===")
+                output_path = executar_job(pipe, kokoro_pipeline, job)
+                resultado.update(status="ok", output_path=output_path, report_path=metrics.report_path_for(output_path))
+                resumo["ok"] += 1
+            except Exception as e:
+                logger.error(f"Erro no job {resultado['id']}: {e}", exc_info=True)
+                resultado.update(status="erro", error=f"{type(e).__name__}: {e}")
+                resumo["erro"] += 1
+            finally:
+                clear_gpu_memory()
+            resultado["duration_s"] = round(time.perf_counter() - inicio, 3)
+            # Uma linha por job, gravada na hora para não perder o progresso de filas longas
+            results.write(json.dumps(resultado, ensure_ascii=False) + "\n")
+            results.flush()
+    print(f"Lote concluído: {resumo['ok']} vídeo(s) gerado(s), {resumo['erro']} erro(s). Resultados em: {results_path}")
+    return resumo
+
 def main():
+    from models import load_models
+    from content import clear_gpu_memory
     logger.info("Iniciando o Video Narrative Generator...")
     print("Bem-vindo ao Video Narrative Generator!")
     
@@ -217,5 +397,165 @@ def main():
     del pipe
     clear_gpu_memory()
 
+def validar_prompts(json_file_path):
+    """Valida um storyboard JSON sem carregar modelos; retorna a lista de problemas encontrados"""
+    from content import process_json_prompts
+    problemas = []
+    try:
+        prompts = process_json_prompts(json_file_path)
+    except (OSError, ValueError) as e:
+        return [str(e)]
+    nomes = set()
+    for i, cena in enumerate(prompts):
+        if not str(cena["prompt_audio"]).strip():
+            problemas.append(f"Cena {i+1}: 'prompt_audio' vazio")
+        if contar_tokens(f"{cena['prompt_image']}, {cena['style']}") > 77:
+            problemas.append(f"Cena {i+1}: prompt_image + style passa de 77 tokens")
+        for chave in ("filename", "audio_filename"):
+            if cena[chave] in nomes:
+                problemas.append(f"Cena {i+1}: '{chave}' repetido ({cena[chave]})")
+            nomes.add(cena[chave])
+    return problemas
+
+def comando_storyboard(args):
+    pasta_projeto = criar_pasta_projeto(args.project)
+    output = args.output or os.path.join(pasta_projeto, f"{args.project}_prompts.json")
+    with metrics.span("storyboard"):
+        storyboard = gerar_storyboard_grok(args.story, args.scenes, args.style, args.type, args.lang)
+    with open(output, "w", encoding="utf-8") as f:
+        json.dump(storyboard, f, ensure_ascii=False, indent=2)
+    print(f"JSON gerado e salvo em: {output}")
+    return 0
+
+def comando_validate(args):
+    codigo = 0
+    for json_file_path in args.json_files:
+        problemas = validar_prompts(json_file_path)
+        for problema in problemas:
+            print(f"❌ {json_file_path}: {problema}")
+        if problemas:
+            codigo = 1
+        else:
+            print(f"✅ {json_file_path}: storyboard válido")
+    return codigo
+
+def opcoes_carregamento(args):
+    """Snapshot local e compilação pedidos na linha de comando (o padrão vem das variáveis de ambiente)"""
+    from models import DIFFUSION_SNAPSHOT_DIR, COMPILE_MODELS
+    return {"snapshot_dir": args.snapshot or DIFFUSION_SNAPSHOT_DIR, "compile": args.compile or COMPILE_MODELS}
+
+def comando_generate(args):
+    from models import load_models
+    from content import process_json_prompts, generate_content, save_content_manifest
+    vozes = IDIOMAS[args.lang]['vozes']
+    voice = args.voice or vozes[0]
+    if voice not in vozes:
+        print(f"❌ Voz '{voice}' não disponível para o idioma '{args.lang}'. Opções: {', '.join(vozes)}")
+        return 2
+    pasta_projeto = criar_pasta_projeto(args.project)
+    config = VideoConfig(
+        args.type, args.project, args.prompts, voice=voice, output_dir=pasta_projeto, lang_code=args.lang,
+        scheduler=args.scheduler, num_inference_steps=args.steps, guidance_scale=args.guidance, quality=args.quality
+    )
+    prompts = process_json_prompts(config.json_file_path)
+    manifest_path = os.path.join(pasta_projeto, f"{args.project}_content{config.file_suffix}.json")
+    # Relatório da geração ao lado do manifesto (<projeto>_content_report.json)
+    run_metrics = metrics.start_run(args.project, collector_url=METRICS_COLLECTOR_URL)
+    run_metrics.set("cenas", len(prompts))
+    try:
+        pipe, kokoro_pipeline = load_models(args.lang, **opcoes_carregamento(args))
+        with metrics.span("geracao", cenas=len(prompts)):
+            content_data = generate_content(pipe, kokoro_pipeline, prompts, config)
+        manifest = save_content_manifest(
+            content_data, manifest_path,
+            project=args.project, type=args.type, lang_code=args.lang, voice=config.voice, quality=args.quality
+        )
+    finally:
+        metrics.finish_run(metrics.report_path_for(manifest_path))
+    print(f"Cenas geradas. Manifesto salvo em: {manifest}")
+    return 0
+
+def comando_render(args):
+    from content import load_content_manifest
+    from video import create_narrative_video
+    content_data, info = load_content_manifest(args.content)
+    project_name = args.project or info.get("project") or "projeto"
+    video_type = args.type or info.get("type", "short")
+    pasta_projeto = os.path.dirname(os.path.abspath(args.content))
+    config = VideoConfig(
+        video_type, project_name, args.content, args.music, output_dir=pasta_projeto, add_subtitles=args.subtitles,
+        output_backend=args.backend, render_mode=args.mode, quality=args.quality or info.get("quality", "final")
+    )
+    output_path = os.path.join(config.output_dir, config.output_filename)
+    metrics.start_run(project_name, collector_url=METRICS_COLLECTOR_URL)
+    try:
+        with metrics.span("video", cenas=len(content_data)):
+            output_path = create_narrative_video(config, content_data)
+    finally:
+        metrics.finish_run(metrics.report_path_for(output_path))
+    return 0
+
+def comando_batch(args):
+    from models import load_models
+    resumo = executar_lote(args.jobs, args.results, loader=functools.partial(load_models, **opcoes_carregamento(args)))
+    return 1 if resumo["erro"] else 0
+
+def adicionar_opcoes_carregamento(p):
+    p.add_argument("--snapshot", help="Pasta local com os snapshots dos checkpoints de difusão, um por repositório (baixados uma vez)")
+    p.add_argument("--compile", action="store_true", help="Compilar UNet/VAE com torch.compile (cache em disco)")
+
+def criar_parser():
+    parser = argparse.ArgumentParser(description="Video Narrative Generator (sem comando: modo interativo)")
+    comandos = parser.add_subparsers(dest="comando")
+
+    p = comandos.add_parser("storyboard", help="Gera só o storyboard JSON com o LLM")
+    p.add_argument("--story", required=True, help="Tema/narrativa")
+    p.add_argument("--scenes", type=int, default=5)
+    p.add_argument("--style", default="cinematic")
+    p.add_argument("--type", default="short", choices=["short", "longo"])
+    p.add_argument("--lang", default="p", choices=sorted(IDIOMAS))
+    p.add_argument("--project", default="projeto")
+    p.add_argument("--output", help="Arquivo JSON de saída (padrão: projetos/<projeto>/<projeto>_prompts.json)")
+    p.set_defaults(func=comando_storyboard)
+
+    p = comandos.add_parser("validate", help="Valida storyboards JSON sem carregar modelos")
+    p.add_argument("json_files", nargs="+")
+    p.set_defaults(func=comando_validate)
+
+    p = comandos.add_parser("generate", help="Gera imagens e narrações a partir de um storyboard")
+    p.add_argument("--prompts", required=True, help="Storyboard JSON")
+    p.add_argument("--project", required=True)
+    p.add_argument("--type", default="short", choices=["short", "longo"])
+    p.add_argument("--lang", default="p", choices=sorted(IDIOMAS))
+    p.add_argument("--voice", default=None, help="Voz do Kokoro (padrão: a primeira do idioma)")
+    p.add_argument("--scheduler", default=None, help="Scheduler da difusão (ver models.SCHEDULERS; padrão: o do checkpoint)")
+    p.add_argument("--steps", type=int, default=DEFAULT_INFERENCE_STEPS, help="Passos de inferência")
+    p.add_argument("--guidance", type=float, default=DEFAULT_GUIDANCE_SCALE, help="Guidance scale")
+    p.add_argument("--quality", default="final", choices=QUALITY_TIERS, help="draft: imagens menores e menos passos, para revisão")
+    adicionar_opcoes_carregamento(p)
+    p.set_defaults(func=comando_generate)
+
+    p = comandos.add_parser("render", help="Renderiza o vídeo a partir do manifesto de cenas do generate")
+    p.add_argument("--content", required=True, help="Manifesto <projeto>_content.json")
+    p.add_argument("--project", default=None)
+    p.add_argument("--type", default=None, choices=["short", "longo"])
+    p.add_argument("--music", default=None, help="Música de fundo")
+    p.add_argument("--subtitles", action="store_true")
+    p.add_argument("--backend", default="moviepy", choices=["moviepy", "ffmpeg"])
+    p.add_argument("--mode", default="single", choices=["single", "segments"])
+    p.add_argument("--quality", default=None, choices=QUALITY_TIERS, help="draft: resolução e fps menores, sem efeitos nem transições (padrão: a do manifesto)")
+    p.set_defaults(func=comando_render)
+
+    p = comandos.add_parser("batch", help="Processa jobs de um JSONL ('-' para a entrada padrão) sem interação")
+    p.add_argument("jobs")
+    p.add_argument("--results", default="resultados.jsonl", help="JSONL com o status e o vídeo de cada job do lote")
+    adicionar_opcoes_carregamento(p)
+    p.set_defaults(func=comando_batch)
+    return parser
+
 if __name__ == "__main__":
-    main()
+    args = criar_parser().parse_args()
+    if args.comando is None:
+        main()
+    else:
+        sys.exit(args.func(args))
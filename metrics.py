@@ -0,0 +1,230 @@
+import os
+import sys
+import json
+import time
+import queue
+import logging
+import resource
+import threading
+import urllib.request
+from contextlib import contextmanager
+
+logger = logging.getLogger(__name__)
+
+REPORT_VERSION = 2  # 2: pico de GPU por execução e pico de RSS rotulado como do processo
+COLLECTOR_QUEUE_SIZE = 1000  # Spans aguardando envio ao coletor; acima disso são descartados
+
+def peak_rss_mb():
+    """Pico de memória residente desde o início do processo (ru_maxrss é em KB no Linux e em bytes no macOS)"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 ** 2 if sys.platform == "darwin" else 1024)
+
+def current_rss_mb():
+    """Memória residente atual (Linux, via /proc), ou None se não disponível"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 ** 2
+    except (OSError, ValueError, IndexError):
+        return None
+
+def peak_gpu_mb():
+    """Pico de memória alocada na GPU pelo torch desde reset_peak_gpu(), ou None sem CUDA (não importa o torch se ele não estiver carregado)"""
+    torch = sys.modules.get("torch")
+    try:
+        if torch is not None and torch.cuda.is_available():
+            return torch.cuda.max_memory_allocated() / 1024 ** 2
+    except Exception:
+        pass
+    return None
+
+def reset_peak_gpu():
+    """Zera o pico de memória da GPU, para cada execução (lote, servidor) medir só o seu"""
+    torch = sys.modules.get("torch")
+    try:
+        if torch is not None and torch.cuda.is_available():
+            torch.cuda.reset_peak_memory_stats()
+    except Exception:
+        pass
+
+_collectors = {}
+_collectors_lock = threading.Lock()
+
+def http_collector(url, timeout=2.0):
+    """Sink que envia cada span como JSON por POST para um coletor local (falhas só geram aviso).
+
+    O envio acontece em uma thread própria por URL, alimentada por uma fila, para
+    que um coletor lento não atrase as threads de difusão e TTS que fecham spans.
+    """
+    with _collectors_lock:
+        send = _collectors.get((url, timeout))
+        if send is not None:
+            return send
+        spans = queue.Queue(maxsize=COLLECTOR_QUEUE_SIZE)
+
+        def post():
+            while True:
+                span = spans.get()
+                request = urllib.request.Request(
+                    url, data=json.dumps(span).encode("utf-8"), headers={"Content-Type": "application/json"}
+                )
+                try:
+                    urllib.request.urlopen(request, timeout=timeout).close()
+                except Exception as e:
+                    logger.warning(f"Coletor de métricas indisponível ({url}): {e}")
+
+        def send(span):
+            try:
+                spans.put_nowait(span)
+            except queue.Full:
+                logger.warning(f"Fila do coletor de métricas cheia ({url}), span descartado")
+
+        threading.Thread(target=post, name="metrics-collector", daemon=True).start()
+        _collectors[(url, timeout)] = send
+        return send
+
+class RunMetrics:
+    """Spans, contadores e valores de uma execução, exportados como relatório JSON.
+
+    Os spans podem ser abertos de qualquer thread; cada span terminado também
+    é repassado aos sinks (ex: http_collector) assim que fecha.
+    """
+
+    def __init__(self, name, sinks=None):
+        self.name = name
+        self.started_at = time.time()
+        self._t0 = time.perf_counter()
+        self.spans = []
+        self.counters = {}
+        self.values = {}
+        self.sinks = list(sinks or [])
+        self._lock = threading.Lock()
+
+    def record(self, name, duration, start=None, **attrs):
+        """Registra um span já medido (start em segundos desde o início da execução)"""
+        span = {
+            "name": name,
+            "start_s": round(start if start is not None else time.perf_counter() - self._t0 - duration, 6),
+            "duration_s": round(duration, 6),
+            "thread": threading.current_thread().name
+        }
+        if attrs:
+            span["attrs"] = attrs
+        with self._lock:
+            self.spans.append(span)
+        for sink in self.sinks:
+            sink(dict(span, run=self.name))
+        return span
+
+    @contextmanager
+    def span(self, name, **attrs):
+        """Mede o bloco; attrs pode ser complementado dentro do bloco (ex: frames renderizados)"""
+        start = time.perf_counter()
+        try:
+            yield attrs
+        except Exception as e:
+            attrs["erro"] = str(e)
+            raise
+        finally:
+            self.record(name, time.perf_counter() - start, start - self._t0, **attrs)
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def set(self, name, value):
+        with self._lock:
+            self.values[name] = value
+
+    def summary(self):
+        """Tempo total e número de chamadas por nome de span"""
+        totals = {}
+        with self._lock:
+            for span in self.spans:
+                entry = totals.setdefault(span["name"], {"total_s": 0.0, "chamadas": 0})
+                entry["total_s"] = round(entry["total_s"] + span["duration_s"], 6)
+                entry["chamadas"] += 1
+        return totals
+
+    def report(self):
+        with self._lock:
+            spans = list(self.spans)
+            counters = dict(self.counters)
+            values = dict(self.values)
+        return {
+            "version": REPORT_VERSION,
+            "run": self.name,
+            "started_at": time.strftime("%Y-%m-%dT%H:%M:%S", time.localtime(self.started_at)),
+            "total_s": round(time.perf_counter() - self._t0, 6),
+            # RSS: pico do processo inteiro (não zera entre jobs de um lote ou do servidor); GPU: pico desta execução
+            "memory": {"process_peak_rss_mb": peak_rss_mb(), "rss_mb": current_rss_mb(), "peak_gpu_mb": peak_gpu_mb()},
+            "summary": self.summary(),
+            "counters": counters,
+            "values": values,
+            "spans": spans
+        }
+
+    def write_report(self, path):
+        """Grava o relatório JSON (escrita atômica)"""
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self.report(), f, indent=2, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        logger.info(f"Relatório de métricas salvo em: {path}")
+        return path
+
+class _NullMetrics:
+    """Usado quando nenhuma execução está ativa: não mede nada"""
+
+    def record(self, name, duration, start=None, **attrs):
+        return None
+
+    @contextmanager
+    def span(self, name, **attrs):
+        yield attrs
+
+    def count(self, name, n=1):
+        pass
+
+    def set(self, name, value):
+        pass
+
+NULL_METRICS = _NullMetrics()
+_active = NULL_METRICS
+_global_sinks = []  # Sinks adicionados a toda execução (ex: progresso do servidor de jobs)
+
+def add_sink(sink):
+    _global_sinks.append(sink)
+
+def remove_sink(sink):
+    if sink in _global_sinks:
+        _global_sinks.remove(sink)
+
+def start_run(name, collector_url=None):
+    """Inicia a coleta de uma execução e a torna ativa para todos os módulos (e threads)"""
+    global _active
+    sinks = [http_collector(collector_url)] if collector_url else []
+    reset_peak_gpu()
+    _active = RunMetrics(name, sinks=sinks + _global_sinks)
+    return _active
+
+def finish_run(report_path=None):
+    """Encerra a execução ativa, gravando o relatório se report_path for informado"""
+    global _active
+    run, _active = _active, NULL_METRICS
+    if report_path and isinstance(run, RunMetrics):
+        run.write_report(report_path)
+    return run
+
+def get_metrics():
+    return _active
+
+def span(name, **attrs):
+    """Atalho para get_metrics().span(...)"""
+    return _active.span(name, **attrs)
+
+def count(name, n=1):
+    _active.count(name, n)
+
+def report_path_for(output_path):
+    """Relatório ao lado do vídeo: video_x.mp4 -> video_x_report.json"""
+    return os.path.splitext(output_path)[0] + "_report.json"
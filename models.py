@@ -1,19 +1,257 @@
-import torch
-from diffusers import DiffusionPipeline
-from kokoro import KPipeline
+import os
+import time
+import logging
+import threading
+from collections import OrderedDict
+from metrics import current_rss_mb
 
-def load_models(lang_code='p'):
+# torch, diffusers e kokoro são importados só ao carregar os modelos, para que os
+# comandos que não precisam deles (storyboard, validate, render) iniciem rápido
+
+logger = logging.getLogger(__name__)
+
+DIFFUSION_REPO_ID = "playgroundai/playground-v2.5-1024px-aesthetic"
+# Pasta local fixa do checkpoint (baixado uma vez); sem ela o cache padrão do Hugging Face é usado
+DIFFUSION_SNAPSHOT_DIR = os.environ.get("DIFFUSION_SNAPSHOT_DIR")
+DIFFUSION_REVISION = os.environ.get("DIFFUSION_REVISION")  # Commit do repositório para fixar a versão
+DIFFUSION_VARIANT = "fp16"  # Pesos em float16 (metade do download e da leitura do disco)
+# torch.compile do UNet/VAE com cache persistente dos grafos compilados entre reinícios
+COMPILE_MODELS = os.environ.get("COMPILE_MODELS") == "1"
+COMPILE_CACHE_DIR = os.environ.get("COMPILE_CACHE_DIR", os.path.join("cache", "torch_compile"))
+
+# Schedulers disponíveis por job (classes do diffusers). O Playground V2.5 é treinado
+# na formulação EDM, então só os "edm_*" servem para ele; os demais são para outros checkpoints
+SCHEDULERS = {
+    "edm_dpm++": "EDMDPMSolverMultistepScheduler",
+    "edm_euler": "EDMEulerScheduler",
+    "dpm++": "DPMSolverMultistepScheduler",
+    "euler": "EulerDiscreteScheduler",
+    "euler_a": "EulerAncestralDiscreteScheduler",
+    "unipc": "UniPCMultistepScheduler",
+    "ddim": "DDIMScheduler"
+}
+
+# Perfil de CPU (nós sem GPU): float16 é lento ou nem tem kernels na CPU
+CPU_DTYPE = os.environ.get("CPU_DTYPE", "float32")  # "float32" ou "bfloat16" (CPUs com AVX512-BF16/AMX)
+CPU_THREADS = int(os.environ.get("CPU_THREADS", "0")) or None  # Threads intra-op (None = núcleos da máquina)
+CPU_INTEROP_THREADS = int(os.environ.get("CPU_INTEROP_THREADS", "1"))  # Threads entre operadores
+# Checkpoint menor/destilado só para CPU (ex: um SDXL Turbo ou SSD-1B) e limite de passos na CPU
+CPU_DIFFUSION_REPO_ID = os.environ.get("CPU_DIFFUSION_REPO_ID")
+CPU_DIFFUSION_VARIANT = os.environ.get("CPU_DIFFUSION_VARIANT")
+CPU_MAX_INFERENCE_STEPS = int(os.environ.get("CPU_MAX_INFERENCE_STEPS", "0")) or None
+
+KOKORO_REPO_ID = "hexgrad/Kokoro-82M"
+KOKORO_POOL_SIZE = 3  # Front-ends de idioma mantidos em memória
+KOKORO_POOL_MAX_MB = None  # Limite estimado de memória dos front-ends (None = só pelo número)
+
+def snapshot_path(repo_id=DIFFUSION_REPO_ID, snapshot_dir=None, revision=None, variant=DIFFUSION_VARIANT):
+    """Garante o checkpoint em uma pasta local fixa e retorna o caminho (sem rede se já estiver lá).
+
+    Cada repositório (e revisão) fica na sua subpasta de snapshot_dir, para o
+    checkpoint de GPU e o de CPU não se confundirem.
+    """
+    local_dir = os.path.join(snapshot_dir, repo_id.replace("/", "--") + (f"@{revision}" if revision else ""))
+    if os.path.isfile(os.path.join(local_dir, "model_index.json")):
+        return local_dir
+    from huggingface_hub import snapshot_download
+    print(f"Baixando {repo_id} para {local_dir}...")
+    patterns = ["*.json", "*.txt", "*.model", f"*.{variant}.safetensors"] if variant else None
+    return snapshot_download(repo_id, revision=revision, local_dir=local_dir, allow_patterns=patterns)
+
+_cpu_threads = None
+
+def configure_cpu_threads(threads=CPU_THREADS, interop_threads=CPU_INTEROP_THREADS):
+    """Ajusta as threads do torch na CPU (uma vez por processo; vale para difusão e Kokoro)"""
+    global _cpu_threads
+    if _cpu_threads is None:
+        import torch
+        _cpu_threads = threads or os.cpu_count() or 1
+        torch.set_num_threads(_cpu_threads)
+        try:
+            torch.set_num_interop_threads(interop_threads)
+        except RuntimeError as e:
+            # Só pode ser definido antes do primeiro trabalho paralelo do torch
+            logger.warning(f"Threads inter-op mantidas: {e}")
+    return _cpu_threads
+
+def inference_steps(pipe, requested):
+    """Passos efetivos para o pipe: o perfil de CPU pode limitar os passos pedidos pelo vídeo"""
+    limit = getattr(pipe, "_max_inference_steps", None)
+    return min(requested, limit) if limit else requested
+
+def apply_scheduler(pipe, name=None):
+    """Troca o scheduler do pipe (None ou "default" = o do checkpoint); as instâncias ficam em cache"""
+    current = getattr(pipe, "scheduler", None)
+    if current is None:
+        return pipe
+    default = pipe.__dict__.setdefault("_default_scheduler", current)
+    if not name or name == "default":
+        pipe.scheduler = default
+        return pipe
+    if name not in SCHEDULERS:
+        raise ValueError(f"Scheduler desconhecido: {name} (opções: {', '.join(sorted(SCHEDULERS))})")
+    cache = pipe.__dict__.setdefault("_scheduler_cache", {})
+    if name not in cache:
+        import diffusers
+        cache[name] = getattr(diffusers, SCHEDULERS[name]).from_config(default.config)
+    pipe.scheduler = cache[name]
+    return pipe
+
+def compile_pipeline(pipe, cache_dir=COMPILE_CACHE_DIR):
+    """Compila UNet e decoder do VAE com torch.compile, guardando os grafos em disco.
+
+    A primeira execução paga a compilação; reinícios seguintes reaproveitam o
+    cache do Inductor em cache_dir.
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    os.environ.setdefault("TORCHINDUCTOR_CACHE_DIR", os.path.abspath(cache_dir))
+    os.environ.setdefault("TORCHINDUCTOR_FX_GRAPH_CACHE", "1")
+    os.environ.setdefault("TORCHINDUCTOR_AUTOGRAD_CACHE", "1")
+    import torch
+    pipe.unet.to(memory_format=torch.channels_last)
+    pipe.unet = torch.compile(pipe.unet, fullgraph=True)
+    pipe.vae.decode = torch.compile(pipe.vae.decode, fullgraph=True)
+    return pipe
+
+def load_models(lang_code='p', snapshot_dir=DIFFUSION_SNAPSHOT_DIR, revision=DIFFUSION_REVISION, compile=COMPILE_MODELS, compile_cache_dir=COMPILE_CACHE_DIR, cpu_repo_id=CPU_DIFFUSION_REPO_ID, cpu_dtype=CPU_DTYPE, cpu_max_steps=CPU_MAX_INFERENCE_STEPS):
+    import torch
+    from diffusers import DiffusionPipeline
+    start = time.perf_counter()
     device = "cuda" if torch.cuda.is_available() else "cpu"
     print(f"Usando dispositivo: {device}")
-    print("Carregando Playground V2.5...")
+    repo_id, dtype, variant = DIFFUSION_REPO_ID, torch.float16, DIFFUSION_VARIANT
+    if device == "cpu":
+        threads = configure_cpu_threads()
+        dtype = getattr(torch, cpu_dtype)
+        if cpu_repo_id:
+            repo_id, variant = cpu_repo_id, CPU_DIFFUSION_VARIANT
+        print(f"Perfil de CPU: {cpu_dtype}, {threads} thread(s)" + (f", no máximo {cpu_max_steps} passos" if cpu_max_steps else ""))
+    print(f"Carregando {repo_id}...")
+    source = snapshot_path(repo_id, snapshot_dir, revision, variant) if snapshot_dir else repo_id
     pipe = DiffusionPipeline.from_pretrained(
-        "playgroundai/playground-v2.5-1024px-aesthetic",
-        torch_dtype=torch.float16,
-        use_safetensors=True
+        source,
+        torch_dtype=dtype,
+        variant=variant,
+        use_safetensors=True,  # safetensors é lido por mmap, sem cópia intermediária em memória
+        low_cpu_mem_usage=True,
+        local_files_only=bool(snapshot_dir),
+        revision=None if snapshot_dir else revision
     ).to(device)
-    if torch.cuda.is_available():
-        pipe.enable_attention_slicing()
-    print(f"Carregando modelo Kokoro com idioma '{lang_code}'...")
-    kokoro_pipeline = KPipeline(lang_code=lang_code)
-    print("Modelos carregados com sucesso!")
-    return pipe, kokoro_pipeline
\ No newline at end of file
+    if torch.cuda.is_available() and not compile:
+        pipe.enable_attention_slicing()  # Quebraria o grafo compilado
+    if device == "cpu":
+        # VAE decodificado em blocos e uma imagem por vez: limita o pico de memória do decode em 1024x1024
+        pipe.enable_vae_tiling()
+        pipe.enable_vae_slicing()
+        pipe._max_inference_steps = cpu_max_steps
+    if compile:
+        compile_pipeline(pipe, compile_cache_dir)
+    diffusion_seconds = time.perf_counter() - start
+    kokoro_pipeline = load_kokoro(lang_code)
+    elapsed = time.perf_counter() - start
+    logger.info(f"Tempo de carga: difusão {diffusion_seconds:.1f}s, total {elapsed:.1f}s")
+    print(f"Modelos carregados com sucesso em {elapsed:.1f}s!")
+    return pipe, kokoro_pipeline
+
+class KokoroPool:
+    """Pipelines do Kokoro por lang_code, criados sob demanda.
+
+    Todos os idiomas usam o mesmo KModel (o modelo acústico); cada pipeline
+    só acrescenta o front-end de G2P do idioma e as vozes já carregadas. O
+    pipeline usado há mais tempo é descartado quando o pool passa do número
+    máximo de idiomas ou do limite de memória estimado.
+    """
+
+    def __init__(self, max_pipelines=KOKORO_POOL_SIZE, max_mb=KOKORO_POOL_MAX_MB, repo_id=KOKORO_REPO_ID, device=None):
+        self.max_pipelines = max(1, max_pipelines)
+        self.max_mb = max_mb
+        self.repo_id = repo_id
+        self.device = device
+        self._model = None
+        self._pipelines = OrderedDict()  # lang_code -> (pipeline, memória estimada em MB)
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def model(self):
+        """KModel compartilhado, carregado na primeira vez"""
+        with self._lock:
+            if self._model is None:
+                import torch
+                from kokoro import KModel
+                device = self.device or ("cuda" if torch.cuda.is_available() else "cpu")
+                if device == "cpu":
+                    configure_cpu_threads()  # Kokoro roda em float32 com as mesmas threads da difusão
+                print(f"Carregando modelo acústico do Kokoro ({device})...")
+                self._model = KModel(repo_id=self.repo_id).to(device).eval()
+            return self._model
+
+    def get(self, lang_code='p', voices=()):
+        """Pipeline do idioma (criado se preciso) com as vozes pedidas já carregadas"""
+        with self._lock:
+            entry = self._pipelines.get(lang_code)
+            if entry is None:
+                self.misses += 1
+                model = self.model()
+                from kokoro import KPipeline
+                print(f"Carregando modelo Kokoro com idioma '{lang_code}'...")
+                before = current_rss_mb()
+                pipeline = KPipeline(lang_code=lang_code, repo_id=self.repo_id, model=model)
+                after = current_rss_mb()
+                entry = (pipeline, max(0.0, after - before) if before is not None and after is not None else 0.0)
+                self._pipelines[lang_code] = entry
+                self._evict(keep=lang_code)
+            else:
+                self.hits += 1
+                self._pipelines.move_to_end(lang_code)
+            pipeline = entry[0]
+            for voice in voices:
+                if voice and voice not in getattr(pipeline, "voices", {}):
+                    pipeline.load_voice(voice)  # Tensor da voz fica em cache no pipeline
+            return pipeline
+
+    def preload(self, lang_codes, voices=None):
+        """Carrega antecipadamente os idiomas (e vozes por idioma: {lang_code: [vozes]})"""
+        for lang_code in lang_codes:
+            self.get(lang_code, (voices or {}).get(lang_code, ()))
+
+    def _evict(self, keep):
+        while len(self._pipelines) > 1:
+            over_count = len(self._pipelines) > self.max_pipelines
+            over_memory = self.max_mb is not None and self.total_mb() > self.max_mb
+            if not over_count and not over_memory:
+                break
+            lang_code = next(iter(self._pipelines))
+            if lang_code == keep:
+                break
+            del self._pipelines[lang_code]
+            self.evictions += 1
+            logger.info(f"Pipeline do Kokoro '{lang_code}' descartado (LRU)")
+
+    def total_mb(self):
+        return sum(size for _, size in self._pipelines.values())
+
+    def stats(self):
+        with self._lock:
+            return {
+                "idiomas": list(self._pipelines),
+                "hits": self.hits,
+                "misses": self.misses,
+                "descartes": self.evictions,
+                "memoria_estimada_mb": round(self.total_mb(), 1),
+                "modelo_carregado": self._model is not None
+            }
+
+_kokoro_pool = None
+
+def get_kokoro_pool():
+    """Pool do Kokoro compartilhado pelo processo"""
+    global _kokoro_pool
+    if _kokoro_pool is None:
+        _kokoro_pool = KokoroPool()
+    return _kokoro_pool
+
+def load_kokoro(lang_code='p', voice=None):
+    """Pipeline do Kokoro para o idioma, vindo do pool (sem recarregar o modelo acústico)"""
+    return get_kokoro_pool().get(lang_code, [voice] if voice else ())
\ No newline at end of file
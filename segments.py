@@ -0,0 +1,176 @@
+import os
+import subprocess
+import hashlib
+import time
+import logging
+from concurrent.futures import ProcessPoolExecutor
+from cache import make_cache_key
+from encoder import FFmpegPipeWriter, encoder_settings, ffmpeg_binary, encode_audio_track
+from audio import build_audio_track
+from timeline import Timeline, OVERLAP_TRANSITIONS, plan_transitions, scene_start_times
+from video import build_scene_visual
+import metrics
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_CACHE_VERSION = 2  # Incrementar quando a renderização dos segmentos mudar
+
+def plan_segments(content_data, config):
+    """Divide a linha do tempo em um segmento por cena, incluindo a transição de saída.
+
+    Cada segmento cobre os frames [start_frame, end_frame) da linha do tempo
+    final; os limites são arredondados a partir dos tempos globais para que a
+    soma dos segmentos bata com o áudio.
+    """
+    durations = [item["duration"] for item in content_data]
+    transitions = plan_transitions(durations, config.transitions)
+    starts = scene_start_times(durations, transitions)
+    fps = config.fps
+    jobs = []
+    for i, item in enumerate(content_data):
+        in_type, in_duration = transitions[i]
+        head = in_duration if in_type in OVERLAP_TRANSITIONS else 0.0
+        jobs.append({
+            "index": i,
+            "item": item,
+            "next_item": content_data[i + 1] if i + 1 < len(content_data) else None,
+            "scene_start": starts[i],
+            "next_scene_start": starts[i + 1] if i + 1 < len(content_data) else None,
+            "in_transition": transitions[i],
+            "out_transition": transitions[i + 1] if i + 1 < len(content_data) else (None, 0.0),
+            "start_frame": int(round((starts[i] + head) * fps)),
+            "end_frame": int(round((starts[i] + durations[i]) * fps))
+        })
+    return jobs, starts, transitions
+
+def _file_digest(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1024 * 1024), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+def _scene_inputs(item, config):
+    return {
+        "image": _file_digest(item["image_path"]),
+        "audio": _file_digest(item["audio_path"]) if item.get("audio_path") else None,
+        "duration": item["duration"],
+        "subtitle": item.get("prompt") if config.add_subtitles else None,
+        "subtitle_font": config.subtitle_font if config.add_subtitles else None
+    }
+
+def segment_fingerprint(job, config, settings):
+    """Impressão digital de todas as entradas que definem os frames de um segmento"""
+    fps = config.fps
+    next_start = job["next_scene_start"]
+    return make_cache_key(
+        version=SEGMENT_CACHE_VERSION,
+        scene=_scene_inputs(job["item"], config),
+        next_scene=_scene_inputs(job["next_item"], config) if job["next_item"] and job["out_transition"][0] in OVERLAP_TRANSITIONS else None,
+        in_transition=job["in_transition"],
+        out_transition=job["out_transition"],
+        # Posição dos frames em relação ao início da cena (muda se cenas anteriores mudarem de duração)
+        local_start=round(job["start_frame"] / fps - job["scene_start"], 6),
+        next_offset=round(next_start - job["scene_start"], 6) if next_start is not None else None,
+        n_frames=job["end_frame"] - job["start_frame"],
+        effects=config.scene_effects,
+        resolution=list(config.final_resolution),
+        fps=fps,
+        # Threads não alteram o conteúdo do segmento, só dividem o trabalho
+        encoder={key: value for key, value in settings.items() if key != "threads"}
+    )
+
+def render_scene_segment(job, config, output_path, settings):
+    """Renderiza uma cena (e sua transição de saída) em um segmento de vídeo sem áudio"""
+    fps = config.fps
+    # Linha do tempo local com a cena e, se houver dissolve de saída, a próxima cena
+    items = [job["item"]]
+    transitions = [job["in_transition"]]
+    if job["out_transition"][0] in OVERLAP_TRANSITIONS and job["next_item"] is not None:
+        items.append(job["next_item"])
+        transitions.append(job["out_transition"])
+    timeline = Timeline(
+        [item["duration"] for item in items],
+        lambda k: build_scene_visual(items[k], config),
+        config.final_resolution,
+        transitions=transitions
+    )
+    # Gravar em arquivo temporário para que um segmento incompleto nunca seja reaproveitado
+    tmp_path = f"{os.path.splitext(output_path)[0]}.tmp.mp4"
+    with FFmpegPipeWriter(tmp_path, config.final_resolution, fps, **settings) as writer:
+        for n in range(job["start_frame"], job["end_frame"]):
+            writer.write_frame(timeline.make_frame(n / fps - job["scene_start"]))
+    os.replace(tmp_path, output_path)
+    return output_path
+
+def _render_segment_worker(args):
+    return render_scene_segment(*args)
+
+def concat_segments(segment_paths, audio_path, output_path, list_path):
+    """Junta os segmentos com o concat demuxer do ffmpeg (sem recodificar) e multiplexa o áudio"""
+    with open(list_path, "w", encoding="utf-8") as f:
+        for path in segment_paths:
+            f.write(f"file '{os.path.abspath(path)}'\n")
+    cmd = [ffmpeg_binary(), "-y", "-loglevel", "error", "-f", "concat", "-safe", "0", "-i", list_path]
+    if audio_path:
+        cmd += ["-i", audio_path, "-map", "0:v", "-map", "1:a", "-shortest"]
+    cmd += ["-c", "copy", "-movflags", "+faststart", output_path]
+    subprocess.run(cmd, check=True)
+    return output_path
+
+def _prune_segments(segments_dir, keep_paths):
+    """Remove segmentos de versões anteriores do projeto que não fazem mais parte do vídeo"""
+    keep = {os.path.basename(path) for path in keep_paths}
+    for name in os.listdir(segments_dir):
+        if name.endswith(".mp4") and name not in keep:
+            os.remove(os.path.join(segments_dir, name))
+
+def render_segments(config, content_data):
+    """Renderiza cada cena em paralelo (ProcessPoolExecutor) e junta tudo com concat sem recodificação"""
+    if not content_data:
+        raise ValueError("Nenhum clipe válido foi criado")
+    jobs, starts, transitions = plan_segments(content_data, config)
+    duration = starts[-1] + content_data[-1]["duration"]
+    workers = config.render_workers or os.cpu_count() or 1
+    workers = max(1, min(workers, len(jobs)))
+    settings = encoder_settings(config)
+    # Dividir as threads do encoder entre os processos para não sobrecarregar a máquina
+    settings["threads"] = max(1, settings["threads"] // workers)
+
+    # Uma pasta por qualidade: rascunho e final do mesmo projeto não apagam os segmentos um do outro
+    segments_dir = os.path.join(config.output_dir, f"segments{config.file_suffix}")
+    os.makedirs(segments_dir, exist_ok=True)
+    output_path = os.path.join(config.output_dir, config.output_filename)
+    if config.segment_cache:
+        # Segmentos nomeados pela impressão digital: só re-renderiza o que mudou
+        segment_paths = [os.path.join(segments_dir, f"{segment_fingerprint(job, config, settings)}.mp4") for job in jobs]
+    else:
+        segment_paths = [os.path.join(segments_dir, f"segment_{job['index']:04d}.mp4") for job in jobs]
+    tasks = [
+        (job, config, path, settings)
+        for job, path in zip(jobs, segment_paths)
+        if not (config.segment_cache and os.path.exists(path))
+    ]
+    print(f"Renderizando {len(tasks)} de {len(jobs)} segmento(s) com {workers} processo(s)... Duração total: {duration:.2f}s")
+
+    metrics.count("segmentos_reaproveitados", len(jobs) - len(tasks))
+    n_frames = sum(job["end_frame"] - job["start_frame"] for job, *_ in tasks)
+    with metrics.span("render_segmentos", segmentos=len(tasks), processos=workers, frames=n_frames) as span:
+        start = time.perf_counter()
+        if tasks:
+            with ProcessPoolExecutor(max_workers=min(workers, len(tasks))) as executor:
+                list(executor.map(_render_segment_worker, tasks))
+        span["fps"] = n_frames / max(time.perf_counter() - start, 1e-9)
+    if config.segment_cache:
+        _prune_segments(segments_dir, segment_paths)
+
+    audio_wav = os.path.join(segments_dir, "audio.wav")
+    audio_path = os.path.join(segments_dir, "audio.m4a")
+    with metrics.span("audio", cenas=len(content_data)):
+        build_audio_track(content_data, starts, transitions, duration, config, audio_wav)
+    with metrics.span("encode_audio"):
+        encode_audio_track(audio_wav, audio_path)
+    with metrics.span("concat", segmentos=len(segment_paths)):
+        concat_segments(segment_paths, audio_path, output_path, os.path.join(segments_dir, "segments.txt"))
+    print(f"Vídeo narrativo salvo em: {output_path}")
+    return output_path
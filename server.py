@@ -0,0 +1,439 @@
+import os
+import json
+import time
+import uuid
+import heapq
+import logging
+import argparse
+import functools
+import threading
+import socketserver
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+import metrics
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_PRIORITY = 5  # Prioridade menor roda antes
+STREAM_POLL_SECONDS = 15  # Intervalo máximo sem mensagens no stream de progresso
+FINISHED = ("ok", "erro", "cancelado")
+# Retenção dos jobs terminados, para um servidor de longa duração não crescer sem limite
+MAX_FINISHED_JOBS = 500
+FINISHED_JOB_TTL_S = 24 * 3600
+FINISHED_EVENTS_KEPT = 50  # Spans mantidos por job terminado (os eventos de status ficam todos)
+
+class JobServer:
+    """Fila de vídeos com prioridade processada por um worker com os modelos residentes.
+
+    Os modelos são carregados uma vez (loader) e o Kokoro de cada idioma vem do
+    pool compartilhado (kokoro_loader). O progresso de cada job vem dos spans de métricas da
+    execução (storyboard, difusão/TTS por cena, render...).
+    """
+
+    def __init__(self, loader=None, runner=None, kokoro_loader=None, prefetch=None):
+        self.kokoro_pool = None
+        self.storyboard_client = None
+        if loader is None or runner is None or kokoro_loader is None:
+            from models import load_models, load_kokoro, get_kokoro_pool
+            from main import executar_job, solicitar_storyboard, get_storyboard_client
+            loader = loader or load_models
+            if kokoro_loader is None:
+                kokoro_loader = load_kokoro
+                self.kokoro_pool = get_kokoro_pool()
+            if runner is None:
+                runner = executar_job
+                prefetch = prefetch or solicitar_storyboard
+                self.storyboard_client = get_storyboard_client()
+        self.loader = loader
+        self.runner = runner
+        self.kokoro_loader = kokoro_loader
+        self.prefetch = prefetch  # Pede o storyboard já na submissão, enquanto o job espera na fila
+        self.jobs = {}
+        self._queue = []
+        self._seq = 0
+        self._cond = threading.Condition()
+        self._current = None
+        self._stopping = False
+        self._worker = None
+        self.started_at = time.time()
+        self.models = None
+        self.lang_code = None
+        self.model_load_s = None
+
+    # ---- fila ----
+
+    def submit(self, spec, priority=DEFAULT_PRIORITY):
+        """Valida e enfileira um job; retorna o estado público do job"""
+        from main import normalizar_job
+        job_id = uuid.uuid4().hex[:12]
+        spec = dict(spec)
+        spec.setdefault("id", job_id)
+        spec.setdefault("project", f"{spec['id']}_{job_id}")
+        job = {
+            "id": job_id,
+            "spec": normalizar_job(spec),
+            "priority": int(priority),
+            "status": "na_fila",
+            "submitted_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+            "output_path": None,
+            "report_path": None,
+            "error": None,
+            "events": [],
+            "event_count": 0
+        }
+        with self._cond:
+            self._prune_finished()
+            self.jobs[job_id] = job
+            heapq.heappush(self._queue, (job["priority"], self._seq, job_id))
+            self._seq += 1
+            self._add_event(job, {"tipo": "status", "status": "na_fila"})
+            self._cond.notify_all()
+        if self.prefetch is not None:
+            try:
+                self.prefetch(job["spec"])
+            except Exception as e:
+                logger.warning(f"Storyboard do job {job_id} não antecipado: {e}")
+        return self.public(job)
+
+    def cancel(self, job_id):
+        """Cancela um job que ainda não começou"""
+        with self._cond:
+            job = self.jobs.get(job_id)
+            if job is None or job["status"] != "na_fila":
+                return False
+            job["status"] = "cancelado"
+            job["finished_at"] = time.time()
+            self._add_event(job, {"tipo": "status", "status": "cancelado"})
+            self._trim_events(job)
+            self._cond.notify_all()
+            return True
+
+    def public(self, job):
+        view = {key: value for key, value in job.items() if key not in ("events", "event_count")}
+        view["eventos"] = job["event_count"]
+        return view
+
+    def get(self, job_id):
+        with self._cond:
+            job = self.jobs.get(job_id)
+            return self.public(job) if job else None
+
+    def list_jobs(self):
+        with self._cond:
+            return [self.public(job) for job in self.jobs.values()]
+
+    def _add_event(self, job, event):
+        # Chamado com self._cond adquirido
+        event["seq"] = job["event_count"]
+        event["t"] = round(time.time() - job["submitted_at"], 3)
+        job["events"].append(event)
+        job["event_count"] += 1
+        self._cond.notify_all()
+
+    def _trim_events(self, job):
+        """Job terminado: mantém os eventos de status e só os últimos spans (seq continua absoluto)"""
+        spans = [event for event in job["events"] if event["tipo"] != "status"]
+        keep = {id(event) for event in spans[-FINISHED_EVENTS_KEPT:]}
+        job["events"] = [event for event in job["events"] if event["tipo"] == "status" or id(event) in keep]
+
+    def _prune_finished(self, now=None):
+        """Descarta jobs terminados há mais de FINISHED_JOB_TTL_S e os mais antigos além de MAX_FINISHED_JOBS"""
+        # Chamado com self._cond adquirido
+        now = now or time.time()
+        finished = sorted(
+            (job for job in self.jobs.values() if job["status"] in FINISHED),
+            key=lambda job: job["finished_at"]
+        )
+        excess = len(finished) - MAX_FINISHED_JOBS
+        for i, job in enumerate(finished):
+            if i < excess or now - job["finished_at"] > FINISHED_JOB_TTL_S:
+                del self.jobs[job["id"]]
+
+    def events(self, job_id, since=0, timeout=None):
+        """Eventos de progresso com seq >= since; com timeout, espera por novos eventos"""
+        with self._cond:
+            job = self.jobs.get(job_id)
+            if job is None:
+                return None
+            if timeout:
+                self._cond.wait_for(
+                    lambda: job["event_count"] > since or job["status"] in FINISHED or self._stopping, timeout
+                )
+            return [event for event in job["events"] if event["seq"] >= since]
+
+    def stats(self):
+        """Profundidade da fila, jobs por estado e vazão"""
+        with self._cond:
+            by_status = {}
+            durations = []
+            for job in self.jobs.values():
+                by_status[job["status"]] = by_status.get(job["status"], 0) + 1
+                if job["status"] == "ok":
+                    durations.append(job["finished_at"] - job["started_at"])
+            uptime = time.time() - self.started_at
+            return {
+                "fila": by_status.get("na_fila", 0),
+                "em_execucao": self._current,
+                "por_status": by_status,
+                "uptime_s": round(uptime, 3),
+                "videos_por_hora": round(len(durations) / (uptime / 3600), 3) if uptime > 0 else 0.0,
+                "duracao_media_s": round(sum(durations) / len(durations), 3) if durations else None,
+                "modelos_carregados": self.models is not None,
+                "idioma_kokoro": self.lang_code,
+                "kokoro_pool": self.kokoro_pool.stats() if self.kokoro_pool is not None else None,
+                "tempo_carga_modelos_s": self.model_load_s,
+                "storyboards": self.storyboard_client.stats() if self.storyboard_client is not None else None
+            }
+
+    # ---- worker ----
+
+    def ensure_models(self, lang_code, voice=None):
+        """Carrega os modelos na primeira vez; o Kokoro de cada idioma vem do pool"""
+        if self.models is None:
+            start = time.perf_counter()
+            self.models = self.loader(lang_code)
+            self.model_load_s = round(time.perf_counter() - start, 3)
+            self.lang_code = lang_code
+        if self.lang_code != lang_code or voice:
+            pipe, _ = self.models
+            self.models = (pipe, self.kokoro_loader(lang_code, voice))
+            self.lang_code = lang_code
+        return self.models
+
+    def _next_job(self):
+        with self._cond:
+            while not self._stopping:
+                while self._queue:
+                    _, _, job_id = heapq.heappop(self._queue)
+                    job = self.jobs.get(job_id)  # Cancelados podem já ter sido descartados
+                    if job is not None and job["status"] == "na_fila":
+                        job["status"] = "executando"
+                        job["started_at"] = time.time()
+                        self._current = job_id
+                        self._add_event(job, {"tipo": "status", "status": "executando"})
+                        return job
+                self._cond.wait()
+            return None
+
+    def _on_span(self, span):
+        with self._cond:
+            job = self.jobs.get(self._current)
+            if job is not None:
+                self._add_event(job, {"tipo": "span", **span})
+
+    def run_job(self, job):
+        try:
+            pipe, kokoro_pipeline = self.ensure_models(job["spec"]["lang_code"], job["spec"]["voice"])
+            output_path = self.runner(pipe, kokoro_pipeline, job["spec"])
+            status, update = "ok", {"output_path": output_path, "report_path": metrics.report_path_for(output_path)}
+        except Exception as e:
+            logger.error(f"Erro no job {job['id']}: {e}", exc_info=True)
+            status, update = "erro", {"error": f"{type(e).__name__}: {e}"}
+        finally:
+            from content import clear_gpu_memory
+            clear_gpu_memory()
+        with self._cond:
+            job.update(update, status=status, finished_at=time.time())
+            self._current = None
+            self._add_event(job, {"tipo": "status", "status": status, **update})
+            self._trim_events(job)
+            self._prune_finished()
+
+    def _work(self):
+        metrics.add_sink(self._on_span)
+        try:
+            while True:
+                job = self._next_job()
+                if job is None:
+                    return
+                self.run_job(job)
+        finally:
+            metrics.remove_sink(self._on_span)
+
+    def start(self, preload_langs=()):
+        """Inicia o worker; os modelos (e o Kokoro de cada idioma em preload_langs) são carregados antes do primeiro job"""
+        def target():
+            if preload_langs:
+                try:
+                    for lang_code in reversed(preload_langs):
+                        self.ensure_models(lang_code)
+                except Exception as e:
+                    logger.error(f"Erro ao pré-carregar os modelos: {e}", exc_info=True)
+            self._work()
+        self._worker = threading.Thread(target=target, name="job-worker", daemon=True)
+        self._worker.start()
+        return self
+
+    def stop(self, timeout=None):
+        with self._cond:
+            self._stopping = True
+            self._cond.notify_all()
+        if self._worker is not None:
+            self._worker.join(timeout)
+
+class JobRequestHandler(BaseHTTPRequestHandler):
+    """API local:
+
+    POST /jobs (spec JSON, "priority" opcional)    GET /jobs    GET /stats
+    GET /jobs/<id>    GET /jobs/<id>/events?since=N    GET /jobs/<id>/stream
+    GET /jobs/<id>/output    GET /jobs/<id>/report    DELETE /jobs/<id>
+    """
+
+    server_version = "VideoNarrativeJobs/1.0"
+
+    @property
+    def jobs(self):
+        return self.server.job_server
+
+    def address_string(self):
+        # Em socket Unix client_address não é (host, porta)
+        return self.client_address[0] if isinstance(self.client_address, tuple) else "unix"
+
+    def log_message(self, format, *args):
+        logger.info(f"{self.address_string()} - {format % args}")
+
+    def _send_json(self, status, payload):
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_file(self, path, content_type):
+        if not path or not os.path.exists(path):
+            return self._send_json(404, {"erro": "arquivo indisponível"})
+        self.send_response(200)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(os.path.getsize(path)))
+        self.send_header("Content-Disposition", f'attachment; filename="{os.path.basename(path)}"')
+        self.end_headers()
+        with open(path, "rb") as f:
+            while True:
+                block = f.read(1024 * 1024)
+                if not block:
+                    break
+                self.wfile.write(block)
+
+    def _route(self):
+        url = urlparse(self.path)
+        parts = [part for part in url.path.split("/") if part]
+        return parts, parse_qs(url.query)
+
+    def do_POST(self):
+        parts, _ = self._route()
+        if parts != ["jobs"]:
+            return self._send_json(404, {"erro": "rota não encontrada"})
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            spec = json.loads(self.rfile.read(length) or b"{}")
+            if not isinstance(spec, dict):
+                raise ValueError("O corpo deve ser um objeto JSON com a especificação do job")
+            priority = spec.pop("priority", DEFAULT_PRIORITY)
+            job = self.jobs.submit(spec, priority)
+        except (ValueError, TypeError) as e:
+            return self._send_json(400, {"erro": str(e)})
+        self._send_json(202, job)
+
+    def do_DELETE(self):
+        parts, _ = self._route()
+        if len(parts) != 2 or parts[0] != "jobs":
+            return self._send_json(404, {"erro": "rota não encontrada"})
+        if not self.jobs.cancel(parts[1]):
+            return self._send_json(409, {"erro": "job inexistente ou já iniciado"})
+        self._send_json(200, self.jobs.get(parts[1]))
+
+    def do_GET(self):
+        parts, query = self._route()
+        if parts == ["stats"]:
+            return self._send_json(200, self.jobs.stats())
+        if parts == ["jobs"]:
+            return self._send_json(200, self.jobs.list_jobs())
+        if len(parts) < 2 or parts[0] != "jobs":
+            return self._send_json(404, {"erro": "rota não encontrada"})
+        job = self.jobs.get(parts[1])
+        if job is None:
+            return self._send_json(404, {"erro": "job não encontrado"})
+        action = parts[2] if len(parts) > 2 else None
+        if action is None:
+            return self._send_json(200, job)
+        if action in ("events", "stream"):
+            try:
+                since = max(0, int(query.get("since", ["0"])[0]))
+            except ValueError:
+                return self._send_json(400, {"erro": "'since' deve ser um número inteiro"})
+            if action == "stream":
+                return self._stream(job["id"], since)
+            return self._send_json(200, self.jobs.events(job["id"], since))
+        if action == "output":
+            return self._send_file(job["output_path"], "video/mp4")
+        if action == "report":
+            return self._send_file(job["report_path"], "application/json")
+        self._send_json(404, {"erro": "rota não encontrada"})
+
+    def _stream(self, job_id, since):
+        """Progresso em NDJSON (um evento por linha) até o job terminar"""
+        self.send_response(200)
+        self.send_header("Content-Type", "application/x-ndjson")
+        self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+        while True:
+            events = self.jobs.events(job_id, since, timeout=STREAM_POLL_SECONDS)
+            if events is None:
+                return  # Job descartado pela retenção
+            for event in events:
+                self.wfile.write((json.dumps(event, ensure_ascii=False) + "\n").encode("utf-8"))
+            self.wfile.flush()
+            if events:
+                since = events[-1]["seq"] + 1
+            job = self.jobs.get(job_id)
+            if job is None or (job["status"] in FINISHED and since >= job["eventos"]):
+                return
+
+class UnixJobHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+def make_http_server(job_server, host="127.0.0.1", port=8765, socket_path=None):
+    """Servidor HTTP local em TCP (host:port) ou em um socket Unix"""
+    if socket_path:
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        httpd = UnixJobHTTPServer(socket_path, JobRequestHandler)
+    else:
+        httpd = ThreadingHTTPServer((host, port), JobRequestHandler)
+        httpd.daemon_threads = True
+    httpd.job_server = job_server
+    return httpd
+
+def main():
+    logging.basicConfig(level=logging.INFO, format="%(asctime)s - %(levelname)s - %(message)s")
+    parser = argparse.ArgumentParser(description="Servidor local de jobs do Video Narrative Generator")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--socket", help="Escutar em um socket Unix em vez de TCP")
+    parser.add_argument("--preload", default="p", help="Idiomas do Kokoro carregados na inicialização, separados por vírgula ('' para carregar no primeiro job)")
+    parser.add_argument("--snapshot", help="Pasta local com os snapshots dos checkpoints de difusão, um por repositório (baixados uma vez)")
+    parser.add_argument("--compile", action="store_true", help="Compilar UNet/VAE com torch.compile (cache em disco)")
+    args = parser.parse_args()
+
+    loader = None
+    if args.snapshot or args.compile:
+        from models import load_models, COMPILE_MODELS, DIFFUSION_SNAPSHOT_DIR
+        loader = functools.partial(load_models, snapshot_dir=args.snapshot or DIFFUSION_SNAPSHOT_DIR, compile=args.compile or COMPILE_MODELS)
+    job_server = JobServer(loader=loader).start(preload_langs=[lang for lang in args.preload.split(",") if lang])
+    httpd = make_http_server(job_server, args.host, args.port, args.socket)
+    print(f"Servidor de jobs em {args.socket or f'http://{args.host}:{args.port}'}")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        print("Encerrando o servidor de jobs...")
+    finally:
+        httpd.server_close()
+        job_server.stop(timeout=5)
+        if args.socket and os.path.exists(args.socket):
+            os.remove(args.socket)
+
+if __name__ == "__main__":
+    main()
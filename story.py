@@ -1,10 +1,13 @@
+import os
 import json
-from groq import Groq
 from datetime import datetime
+from storyboard_client import StoryboardClient, make_backend, STORYBOARD_BACKEND
 
 # Configurações
-API_KEY = "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"
-client = Groq(api_key=API_KEY)
+API_KEY = os.environ.get("GROQ_API_KEY")
+MODEL = "llama3-70b-8192"
+# Com cache em disco e novas tentativas; o backend pode ser trocado por STORYBOARD_BACKEND
+client = StoryboardClient(make_backend(STORYBOARD_BACKEND, api_key=API_KEY))
 
 def contar_tokens(texto):
     """Conta tokens aproximados (1 token ≈ 1 palavra em inglês)"""
@@ -102,16 +105,12 @@ def gerar_storyboard():
         print("\n⏳ Gerando storyboard ultra-consistente...")
         
         # Chamada à API
-        resposta = client.chat.completions.create(
-            messages=[{"role": "user", "content": prompt}],
-            model="llama3-70b-8192",
-            response_format={"type": "json_object"},
-            temperature=0.3  # Baixa temperatura = mais consistência
-        ).choices[0].message.content
-        
-        # Processamento
-        dados = json.loads(resposta)
-        storyboard = aplicar_consistencia(dados)
+        storyboard = client.complete(
+            prompt,
+            model=MODEL,
+            temperature=0.3,  # Baixa temperatura = mais consistência
+            parse=lambda resposta: aplicar_consistencia(json.loads(resposta))
+        )
         
         # Salvamento
         timestamp = datetime.now().strftime("%Y%m%d_%H%M%S")
@@ -0,0 +1,244 @@
+import os
+import json
+import time
+import random
+import logging
+import tempfile
+import threading
+import contextlib
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from cache import AssetCache, make_cache_key
+
+logger = logging.getLogger(__name__)
+
+STORYBOARD_MODEL = "meta-llama/llama-4-scout-17b-16e-instruct"
+STORYBOARD_TEMPERATURE = 0.3
+# Backend do LLM: "groq", a URL de um servidor local compatível com OpenAI
+# (ex: http://localhost:8080/v1) ou "fixture:<arquivo.jsonl>" para reproduzir respostas gravadas
+STORYBOARD_BACKEND = os.environ.get("STORYBOARD_BACKEND", "groq")
+STORYBOARD_CONCURRENCY = int(os.environ.get("STORYBOARD_CONCURRENCY", "4"))  # Chamadas simultâneas ao LLM
+STORYBOARD_MAX_RETRIES = 4
+STORYBOARD_BACKOFF_S = 1.0  # Espera da primeira nova tentativa (dobra a cada erro, com jitter)
+STORYBOARD_CACHE_DIR = os.path.join("cache", "storyboards")
+STORYBOARD_CACHE_MAX_BYTES = 256 * 1024 ** 2
+
+TRANSIENT_STATUS = {408, 409, 429}  # Além dos 5xx
+
+def is_transient_error(e):
+    """Erros que valem uma nova tentativa: limite de taxa, timeout, conexão e 5xx"""
+    status = getattr(e, "status_code", None) or getattr(e, "code", None)
+    if isinstance(status, int):
+        return status in TRANSIENT_STATUS or status >= 500
+    if isinstance(e, (ConnectionError, TimeoutError, urllib.error.URLError)):
+        return True
+    # Exceções do SDK do Groq sem status (conexão/timeout)
+    return type(e).__name__ in ("APIConnectionError", "APITimeoutError")
+
+def retry_after(e):
+    """Segundos pedidos pelo servidor no cabeçalho Retry-After, se houver"""
+    headers = getattr(getattr(e, "response", None), "headers", None) or getattr(e, "headers", None)
+    try:
+        return float(headers.get("retry-after")) if headers else None
+    except (TypeError, ValueError):
+        return None
+
+class GroqBackend:
+    """Chat completions da API do Groq (cliente criado no primeiro uso, o import do groq é lento)"""
+
+    def __init__(self, api_key=None):
+        self.api_key = api_key or os.environ.get("GROQ_API_KEY")
+        if not self.api_key:
+            raise ValueError(
+                "GROQ_API_KEY não definida: exporte a chave da API do Groq ou use "
+                "STORYBOARD_BACKEND=<url do servidor local> ou fixture:<arquivo.jsonl>"
+            )
+        self._client = None
+        self._lock = threading.Lock()
+
+    def client(self):
+        with self._lock:
+            if self._client is None:
+                from groq import Groq
+                # As novas tentativas ficam a cargo do StoryboardClient
+                self._client = Groq(api_key=self.api_key, max_retries=0)
+            return self._client
+
+    def __call__(self, prompt, model, temperature):
+        return self.client().chat.completions.create(
+            messages=[{"role": "user", "content": prompt}],
+            model=model,
+            response_format={"type": "json_object"},
+            temperature=temperature
+        ).choices[0].message.content
+
+class HTTPBackend:
+    """Servidor local compatível com a API da OpenAI (POST <url>/chat/completions)"""
+
+    def __init__(self, url, timeout=120.0, api_key=None):
+        self.url = url.rstrip("/")
+        self.timeout = timeout
+        self.api_key = api_key
+
+    def __call__(self, prompt, model, temperature):
+        body = {
+            "model": model,
+            "messages": [{"role": "user", "content": prompt}],
+            "temperature": temperature,
+            "response_format": {"type": "json_object"}
+        }
+        headers = {"Content-Type": "application/json"}
+        if self.api_key:
+            headers["Authorization"] = f"Bearer {self.api_key}"
+        request = urllib.request.Request(f"{self.url}/chat/completions", data=json.dumps(body).encode("utf-8"), headers=headers)
+        with urllib.request.urlopen(request, timeout=self.timeout) as response:
+            return json.loads(response.read().decode("utf-8"))["choices"][0]["message"]["content"]
+
+class FixtureBackend:
+    """Reproduz respostas gravadas, sem rede (testes e ensaios).
+
+    O arquivo é um JSONL com {"model", "prompt", "temperature", "response"} por
+    linha; a busca é pela mesma chave do cache e, sem ela, só pelo prompt.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.by_key = {}
+        self.by_prompt = {}
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                if not line.strip():
+                    continue
+                entry = json.loads(line)
+                response = entry["response"]
+                if not isinstance(response, str):
+                    response = json.dumps(response, ensure_ascii=False)
+                self.by_key[request_key(entry.get("model"), entry["prompt"], entry.get("temperature"))] = response
+                self.by_prompt[entry["prompt"]] = response
+
+    def __call__(self, prompt, model, temperature):
+        response = self.by_key.get(request_key(model, prompt, temperature), self.by_prompt.get(prompt))
+        if response is None:
+            raise KeyError(f"Nenhuma resposta gravada para este prompt em {self.path}")
+        return response
+
+def make_backend(spec=STORYBOARD_BACKEND, api_key=None):
+    """Cria o backend a partir de "groq", de uma URL http(s) ou de "fixture:<arquivo>" """
+    if spec.startswith("fixture:"):
+        return FixtureBackend(spec[len("fixture:"):])
+    if spec.startswith(("http://", "https://")):
+        return HTTPBackend(spec)
+    if spec == "groq":
+        return GroqBackend(api_key)
+    raise ValueError(f"Backend de storyboard desconhecido: {spec}")
+
+def request_key(model, prompt, temperature):
+    return make_cache_key(model=model, prompt=prompt, temperature=temperature)
+
+class StoryboardClient:
+    """Chamadas ao LLM com cache em disco, novas tentativas e limite de concorrência.
+
+    complete() bloqueia a thread que chama; submit() devolve um Future e roda
+    em um pool com max_concurrency threads. As respostas ficam em cache por
+    (modelo, prompt, temperatura), e pedidos idênticos simultâneos esperam
+    pela mesma chamada em vez de repeti-la.
+    """
+
+    def __init__(self, backend, cache_dir=STORYBOARD_CACHE_DIR, max_concurrency=STORYBOARD_CONCURRENCY, max_retries=STORYBOARD_MAX_RETRIES, backoff_s=STORYBOARD_BACKOFF_S, cache_max_bytes=STORYBOARD_CACHE_MAX_BYTES):
+        self.backend = backend
+        self.cache = AssetCache(cache_dir, cache_max_bytes, suffix=".json") if cache_dir else None
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_retries = max_retries
+        self.backoff_s = backoff_s
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency, thread_name_prefix="storyboard")
+        self._key_locks = {}  # chave -> [lock, pedidos usando o lock]
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.retries = 0
+
+    @contextlib.contextmanager
+    def _key_lock(self, key):
+        """Lock por chave, removido quando o último pedido com essa chave termina"""
+        with self._lock:
+            entry = self._key_locks.setdefault(key, [threading.Lock(), 0])
+            entry[1] += 1
+        try:
+            with entry[0]:
+                yield
+        finally:
+            with self._lock:
+                entry[1] -= 1
+                if entry[1] == 0:
+                    del self._key_locks[key]
+
+    def _cached(self, key):
+        if self.cache is None:
+            return None
+        try:
+            data = self.cache.read(key)
+            return json.loads(data)["response"] if data is not None else None
+        except (OSError, ValueError, KeyError):
+            return None
+
+    def _store(self, key, model, temperature, response):
+        if self.cache is None:
+            return
+        fd, tmp_path = tempfile.mkstemp(suffix=".json")
+        try:
+            with os.fdopen(fd, "w", encoding="utf-8") as f:
+                json.dump({"model": model, "temperature": temperature, "response": response}, f, ensure_ascii=False)
+            self.cache.put(key, tmp_path, meta={"model": model})
+            self.cache.flush()  # Poucas respostas e caras de refazer: o índice é gravado a cada uma
+        finally:
+            os.remove(tmp_path)
+
+    def _call_with_retries(self, prompt, model, temperature):
+        attempt = 0
+        while True:
+            try:
+                with self._slots:
+                    with self._lock:
+                        self.calls += 1
+                    return self.backend(prompt, model, temperature)
+            except Exception as e:
+                if attempt >= self.max_retries or not is_transient_error(e):
+                    raise
+                # Retry-After do servidor limitado à maior espera do próprio backoff
+                delay = min(retry_after(e) or self.backoff_s * 2 ** attempt * random.uniform(0.5, 1.5), self.backoff_s * 2 ** self.max_retries)
+                attempt += 1
+                with self._lock:
+                    self.retries += 1
+                logger.warning(f"Erro transitório do LLM ({type(e).__name__}: {e}); nova tentativa {attempt}/{self.max_retries} em {delay:.1f}s")
+                time.sleep(delay)
+
+    def complete(self, prompt, model=STORYBOARD_MODEL, temperature=STORYBOARD_TEMPERATURE, parse=None):
+        """Resposta do LLM para o prompt, do cache quando possível.
+
+        Com parse, retorna parse(resposta); uma resposta que parse rejeita
+        (exceção) não vai para o cache.
+        """
+        key = request_key(model, prompt, temperature)
+        with self._key_lock(key):
+            response = self._cached(key)
+            if response is not None:
+                logger.info("Resposta do LLM reaproveitada do cache.")
+                return parse(response) if parse is not None else response
+            response = self._call_with_retries(prompt, model, temperature)
+            result = parse(response) if parse is not None else response
+            self._store(key, model, temperature, response)
+            return result
+
+    def submit(self, prompt, model=STORYBOARD_MODEL, temperature=STORYBOARD_TEMPERATURE, parse=None):
+        """Como complete(), mas sem bloquear: retorna um Future"""
+        return self._executor.submit(self.complete, prompt, model, temperature, parse)
+
+    def stats(self):
+        stats = {"chamadas": self.calls, "novas_tentativas": self.retries, "concorrencia": self.max_concurrency}
+        if self.cache is not None:
+            stats["cache"] = self.cache.stats()
+        return stats
+
+    def shutdown(self, wait=True):
+        self._executor.shutdown(wait=wait)
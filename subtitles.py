@@ -0,0 +1,126 @@
+import logging
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+import numpy as np
+from PIL import Image, ImageDraw, ImageFont
+
+logger = logging.getLogger(__name__)
+
+# Fontes procuradas em ordem quando nenhuma é informada (equivalentes à Arial-Bold do ImageMagick)
+FONTES_PADRAO = ["arialbd.ttf", "Arial Bold.ttf", "Arial-Bold.ttf", "DejaVuSans-Bold.ttf", "LiberationSans-Bold.ttf"]
+CORES_PALAVRAS = ['#FFFFFF', '#F5F5F5', '#FAFAFA', '#F0F0F0', '#EFEFEF']
+MAX_SPRITES_POR_ATLAS = 4096  # Palavras rasterizadas mantidas por atlas (LRU por (palavra, cor))
+
+def load_font(font, size):
+    """Carrega a fonte TrueType pedida (ou a primeira disponível) com a fonte padrão do PIL como último recurso"""
+    for candidate in ([font] if font else []) + FONTES_PADRAO:
+        try:
+            return ImageFont.truetype(candidate, size)
+        except OSError:
+            continue
+    logger.warning("Nenhuma fonte TrueType encontrada para as legendas, usando a fonte padrão do PIL")
+    return ImageFont.load_default(size=size)
+
+class WordAtlas:
+    """Cache de palavras rasterizadas para uma combinação de fonte, tamanho e contorno.
+
+    Cada palavra é desenhada uma única vez com o PIL e guardada como (rgb, alpha)
+    em uint16, prontos para a mistura por aritmética inteira. Só as
+    max_sprites palavras usadas mais recentemente ficam guardadas.
+    """
+
+    def __init__(self, font, size, stroke_width, stroke_color, max_sprites=MAX_SPRITES_POR_ATLAS):
+        self.font = load_font(font, size)
+        self.stroke_width = stroke_width
+        self.stroke_color = stroke_color
+        self.max_sprites = max_sprites
+        self.sprites = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, word, color):
+        key = (word, color)
+        with self._lock:
+            sprite = self.sprites.get(key)
+            if sprite is not None:
+                self.sprites.move_to_end(key)
+                return sprite
+        left, top, right, bottom = self.font.getbbox(word, stroke_width=self.stroke_width)
+        image = Image.new("RGBA", (max(1, right - left), max(1, bottom - top)), (0, 0, 0, 0))
+        ImageDraw.Draw(image).text(
+            (-left, -top), word, font=self.font, fill=color,
+            stroke_width=self.stroke_width, stroke_fill=self.stroke_color
+        )
+        pixels = np.asarray(image).astype(np.uint16)
+        sprite = (pixels[:, :, :3], pixels[:, :, 3:])
+        with self._lock:
+            self.sprites[key] = sprite
+            while len(self.sprites) > self.max_sprites:
+                self.sprites.popitem(last=False)
+        return sprite
+
+@lru_cache(maxsize=16)
+def get_atlas(font, size, stroke_width=2, stroke_color="black"):
+    """Atlas compartilhado por (fonte, tamanho, contorno)"""
+    return WordAtlas(font, size, stroke_width, stroke_color)
+
+class SubtitleRenderer:
+    """Legendas dinâmicas palavra por palavra desenhadas direto nos frames.
+
+    A animação (fade in/out e leve subida) é calculada analiticamente a partir
+    de t, e só a caixa da palavra visível é misturada no frame.
+    """
+
+    def __init__(self, text, duration, final_resolution, font=None):
+        self.width, self.height = final_resolution
+        self.words = text.split()
+        self.duration = duration
+        self.word_duration = duration / len(self.words) if self.words else duration
+        self.fade_duration = min(0.3, self.word_duration / 3)
+        font_size = min(40, int(self.width / 25))  # Tamanho de fonte adaptativo
+        self.atlas = get_atlas(font, font_size)
+        self.sprites = [self.atlas.get(word, CORES_PALAVRAS[i % len(CORES_PALAVRAS)]) for i, word in enumerate(self.words)]
+
+    def word_state(self, t):
+        """Retorna (índice da palavra, opacidade, deslocamento vertical) no instante t, ou None"""
+        if not self.words or t < 0 or t >= self.duration:
+            return None
+        idx = min(int(t / self.word_duration), len(self.words) - 1)
+        local_t = t - idx * self.word_duration
+        opacity = 1.0
+        if self.fade_duration > 0:
+            opacity = min(1.0, local_t / self.fade_duration, (self.word_duration - local_t) / self.fade_duration)
+        # Movimento suave para a posição final
+        prog = min(1.0, local_t / (self.word_duration * 0.4))
+        y_offset = 20 * (1 - prog)
+        return idx, max(0.0, opacity), y_offset
+
+    def draw(self, frame, t, inplace=False):
+        """Desenha a palavra ativa no frame; com inplace=False o frame original não é alterado"""
+        state = self.word_state(t)
+        if state is None:
+            return frame
+        idx, opacity, y_offset = state
+        weight = int(round(opacity * 256))
+        if weight <= 0:
+            return frame
+        rgb, alpha = self.sprites[idx]
+        h, w = alpha.shape[:2]
+        x = (self.width - w) // 2
+        y = int(round(self.height - 120 - y_offset))
+        # Recortar a caixa da palavra aos limites do frame
+        x0, y0 = max(0, x), max(0, y)
+        x1, y1 = min(self.width, x + w), min(self.height, y + h)
+        if x0 >= x1 or y0 >= y1:
+            return frame
+        if not inplace or not frame.flags.writeable:
+            frame = frame.copy()
+        region = frame[y0:y1, x0:x1]
+        a = (alpha[y0 - y:y1 - y, x0 - x:x1 - x] * weight + 255) >> 8
+        src = rgb[y0 - y:y1 - y, x0 - x:x1 - x]
+        region[:] = ((region * (256 - a) + src * a) >> 8).astype(np.uint8)
+        return frame
+
+    def apply(self, clip, inplace=False):
+        """Aplica as legendas a um clipe do moviepy"""
+        return clip.fl(lambda gf, t: self.draw(gf(t), t, inplace=inplace))
@@ -0,0 +1,60 @@
+import sys
+import types
+import pytest
+from PIL import Image
+
+from config import VideoConfig
+from content import generate_images_batched
+
+class FakeGenerator:
+    def __init__(self, device):
+        self.seed = None
+
+    def manual_seed(self, seed):
+        self.seed = seed
+        return self
+
+@pytest.fixture
+def fake_torch(monkeypatch):
+    """torch mínimo (sem GPU) para os testes não dependerem da instalação real"""
+    torch = types.SimpleNamespace(
+        Generator=FakeGenerator,
+        cuda=types.SimpleNamespace(is_available=lambda: False, OutOfMemoryError=MemoryError)
+    )
+    monkeypatch.setitem(sys.modules, "torch", torch)
+    return torch
+
+class OOMPipe:
+    """Pipe de difusão falso que fica sem memória com lotes maiores que max_batch"""
+
+    def __init__(self, max_batch):
+        self.max_batch = max_batch
+        self.calls = []
+
+    def __call__(self, prompt, generator, width, height, **kwargs):
+        self.calls.append([g.seed for g in generator])
+        if len(prompt) > self.max_batch:
+            raise RuntimeError("CUDA out of memory. Tried to allocate 2.00 GiB")
+        return types.SimpleNamespace(images=[Image.new("RGB", (width, height)) for _ in prompt])
+
+def test_generate_images_batched_halves_batch_on_oom(fake_torch, tmp_path):
+    config = VideoConfig("short", "teste", None, output_dir=str(tmp_path))
+    config.device = "cpu"
+    jobs = [(idx, f"cena {idx}", str(tmp_path / f"scene_{idx}.png")) for idx in range(5)]
+    pipe = OOMPipe(max_batch=2)
+    saved = []
+    generate_images_batched(pipe, jobs, config, 100, 8, 8, batch_size=4, on_image=saved.append)
+    # Lote de 4 falha, depois segue com lotes de 2 mantendo o seed de cada cena
+    assert pipe.calls == [[100, 101, 102, 103], [100, 101], [102, 103], [104]]
+    assert saved == [0, 1, 2, 3, 4]
+    assert all((tmp_path / f"scene_{idx}.png").exists() for idx in range(5))
+
+def test_generate_images_batched_reraises_other_errors(fake_torch, tmp_path):
+    config = VideoConfig("short", "teste", None, output_dir=str(tmp_path))
+    config.device = "cpu"
+
+    def broken_pipe(**kwargs):
+        raise ValueError("prompt inválido")
+
+    with pytest.raises(ValueError):
+        generate_images_batched(broken_pipe, [(0, "cena", str(tmp_path / "a.png"))], config, 0, 8, 8, batch_size=2)
@@ -0,0 +1,27 @@
+import numpy as np
+import pytest
+from moviepy.video.VideoClip import VideoClip
+
+from video import CinematicEffects
+
+def test_split_effects():
+    effects = [
+        {"name": "color_grading", "style": "drama"},
+        {"name": "vignette", "intensity": 0.4, "before_motion": True},
+        {"name": "vignette", "intensity": 0.2, "before_motion": False},
+        {"name": "film_grain"}
+    ]
+    source, per_frame = CinematicEffects.split_effects(effects)
+    assert source == effects[:2]
+    assert per_frame == effects[2:]
+    with pytest.raises(ValueError):
+        CinematicEffects.split_effects([{"name": "desconhecido"}])
+
+def test_apply_frame_effects_ignores_before_motion():
+    frame = np.full((32, 48, 3), 200, dtype=np.uint8)
+    clip = VideoClip(lambda t: frame, duration=1)
+    _, per_frame = CinematicEffects.split_effects([{"name": "vignette", "intensity": 0.5, "before_motion": False}, {"name": "film_grain"}])
+    result = CinematicEffects.apply_frame_effects(clip, per_frame).get_frame(0.5)
+    assert result.shape == frame.shape
+    # A vinheta escurece os cantos mais que o centro
+    assert result[0, 0].mean() < result[16, 24].mean()
@@ -0,0 +1,122 @@
+import json
+import threading
+import http.client
+import pytest
+
+import metrics
+from benchmark import StubImagePipeline, StubKokoroPipeline
+from server import JobServer, make_http_server
+
+@pytest.fixture
+def job_server(tmp_path):
+    """JobServer com os modelos de teste do benchmark e um runner que só chama os pipelines"""
+    order = []
+
+    def runner(pipe, kokoro_pipeline, job):
+        metrics.start_run(job["project"])
+        order.append(job["id"])
+        with metrics.span("difusao_cena", cena=0):
+            image = pipe(prompt=[job["story"]], width=32, height=32).images[0]
+        with metrics.span("tts_cena", cena=0):
+            list(kokoro_pipeline(job["story"], voice=job["voice"]))
+        if "falha" in job["story"]:
+            metrics.finish_run()
+            raise RuntimeError("falha simulada")
+        output_path = str(tmp_path / f"{job['project']}.png")
+        image.save(output_path)
+        metrics.finish_run(metrics.report_path_for(output_path))
+        return output_path
+
+    server = JobServer(
+        loader=lambda lang_code: (StubImagePipeline(), StubKokoroPipeline()),
+        runner=runner,
+        kokoro_loader=lambda lang_code, voice=None: StubKokoroPipeline()
+    )
+    server.order = order
+    yield server
+    server.stop(timeout=5)
+
+@pytest.fixture
+def http_port(job_server):
+    httpd = make_http_server(job_server, port=0)
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    yield httpd.server_address[1]
+    httpd.shutdown()
+    httpd.server_close()
+
+def request(port, method, path, body=None):
+    connection = http.client.HTTPConnection("127.0.0.1", port, timeout=10)
+    connection.request(method, path, body=body if body is None or isinstance(body, str) else json.dumps(body))
+    response = connection.getresponse()
+    data = response.read()
+    connection.close()
+    return response.status, json.loads(data)
+
+def wait_finished(job_server, job_ids):
+    with job_server._cond:
+        job_server._cond.wait_for(lambda: all(job_server.jobs[job_id]["status"] in ("ok", "erro", "cancelado") for job_id in job_ids), 10)
+
+def test_jobs_run_by_priority_then_submission_order(job_server):
+    low = job_server.submit({"id": "baixa", "story": "um robô"}, priority=9)
+    first = job_server.submit({"id": "alta1", "story": "o mar"}, priority=1)
+    second = job_server.submit({"id": "alta2", "story": "a lua"}, priority=1)
+    job_server.start()
+    wait_finished(job_server, [low["id"], first["id"], second["id"]])
+    assert job_server.order == ["alta1", "alta2", "baixa"]
+    assert job_server.get(low["id"])["status"] == "ok"
+    assert job_server.stats()["por_status"] == {"ok": 3}
+
+def test_failed_job_does_not_stop_the_queue(job_server):
+    bad = job_server.submit({"id": "ruim", "story": "falha"}, priority=1)
+    good = job_server.submit({"id": "bom", "story": "o mar"}, priority=2)
+    job_server.start()
+    wait_finished(job_server, [bad["id"], good["id"]])
+    assert job_server.get(bad["id"])["error"] == "RuntimeError: falha simulada"
+    assert job_server.get(good["id"])["status"] == "ok"
+
+def test_cancel_only_queued_jobs(job_server):
+    job = job_server.submit({"story": "um robô"})
+    assert job_server.cancel(job["id"])
+    assert not job_server.cancel(job["id"])
+    assert not job_server.cancel("inexistente")
+    job_server.start()
+    other = job_server.submit({"story": "o mar"})
+    wait_finished(job_server, [other["id"]])
+    assert job_server.get(job["id"])["status"] == "cancelado"
+    assert job_server.order == [other["spec"]["id"]]
+
+def test_events_include_spans_and_status(job_server):
+    job = job_server.submit({"story": "um robô"})
+    job_server.start()
+    wait_finished(job_server, [job["id"]])
+    events = job_server.events(job["id"])
+    assert [event["seq"] for event in events] == list(range(len(events)))
+    assert [event["status"] for event in events if event["tipo"] == "status"] == ["na_fila", "executando", "ok"]
+    assert {"difusao_cena", "tts_cena"} <= {event["name"] for event in events if event["tipo"] == "span"}
+    assert job_server.events(job["id"], since=len(events)) == []
+
+def test_http_submit_cancel_and_stream(job_server, http_port):
+    status, job = request(http_port, "POST", "/jobs", {"story": "um robô", "priority": 3})
+    assert status == 202 and job["priority"] == 3
+    status, queued = request(http_port, "POST", "/jobs", {"story": "o mar"})
+    assert request(http_port, "DELETE", f"/jobs/{queued['id']}")[0] == 200
+    job_server.start()
+
+    connection = http.client.HTTPConnection("127.0.0.1", http_port, timeout=10)
+    connection.request("GET", f"/jobs/{job['id']}/stream")
+    lines = [json.loads(line) for line in connection.getresponse()]
+    connection.close()
+    assert lines[-1]["status"] == "ok"
+    assert [line["seq"] for line in lines] == list(range(len(lines)))
+
+    status, events = request(http_port, "GET", f"/jobs/{job['id']}/events?since=1")
+    assert status == 200 and events[0]["seq"] == 1
+    assert request(http_port, "GET", f"/jobs/{queued['id']}")[1]["status"] == "cancelado"
+
+def test_http_rejects_invalid_requests(job_server, http_port):
+    assert request(http_port, "POST", "/jobs", "\"x\"")[0] == 400
+    assert request(http_port, "POST", "/jobs", {"scenes": 2})[0] == 400
+    status, job = request(http_port, "POST", "/jobs", {"story": "um robô"})
+    assert request(http_port, "GET", f"/jobs/{job['id']}/events?since=abc")[0] == 400
+    assert request(http_port, "GET", f"/jobs/{job['id']}/stream?since=abc")[0] == 400
+    assert request(http_port, "GET", "/jobs/inexistente")[0] == 404
@@ -0,0 +1,101 @@
+import json
+import threading
+import pytest
+
+from storyboard_client import StoryboardClient, FixtureBackend
+
+class CountingBackend:
+    def __init__(self, backend, delay=None):
+        self.backend = backend
+        self.delay = delay
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def __call__(self, prompt, model, temperature):
+        with self._lock:
+            self.calls += 1
+        if self.delay is not None:
+            self.delay.wait(5)
+        return self.backend(prompt, model, temperature)
+
+@pytest.fixture
+def fixture_backend(tmp_path):
+    path = tmp_path / "respostas.jsonl"
+    with open(path, "w", encoding="utf-8") as f:
+        for prompt in ("robô", "mar"):
+            f.write(json.dumps({"prompt": prompt, "response": {"scenes": [prompt]}}, ensure_ascii=False) + "\n")
+    return FixtureBackend(str(path))
+
+def test_storyboard_client_caches_on_disk(fixture_backend, tmp_path):
+    backend = CountingBackend(fixture_backend)
+    client = StoryboardClient(backend, cache_dir=str(tmp_path / "cache"))
+    assert client.complete("robô", parse=json.loads) == {"scenes": ["robô"]}
+    assert client.complete("robô", parse=json.loads) == {"scenes": ["robô"]}
+    client.shutdown()
+    # Um novo cliente (outro processo) reaproveita a resposta gravada em disco
+    reopened = StoryboardClient(backend, cache_dir=str(tmp_path / "cache"))
+    assert json.loads(reopened.complete("robô")) == {"scenes": ["robô"]}
+    assert backend.calls == 1
+    reopened.shutdown()
+
+def test_storyboard_client_skips_cache_when_parse_fails(fixture_backend, tmp_path):
+    backend = CountingBackend(fixture_backend)
+    client = StoryboardClient(backend, cache_dir=str(tmp_path / "cache"))
+
+    def reject(response):
+        raise ValueError("storyboard inválido")
+
+    with pytest.raises(ValueError):
+        client.complete("mar", parse=reject)
+    client.complete("mar")
+    assert backend.calls == 2
+    client.shutdown()
+
+def test_storyboard_client_deduplicates_concurrent_requests(fixture_backend, tmp_path):
+    release = threading.Event()
+    backend = CountingBackend(fixture_backend, delay=release)
+    client = StoryboardClient(backend, cache_dir=str(tmp_path / "cache"), max_concurrency=4)
+    futures = [client.submit("mar") for _ in range(8)]
+    release.set()
+    assert {future.result(timeout=10) for future in futures} == {json.dumps({"scenes": ["mar"]})}
+    assert backend.calls == 1
+    assert client._key_locks == {}
+    client.shutdown()
+
+class FlakyBackend:
+    """Falha com erros transitórios nas primeiras failures chamadas"""
+
+    def __init__(self, failures, error=ConnectionError):
+        self.failures = failures
+        self.error = error
+        self.calls = 0
+
+    def __call__(self, prompt, model, temperature):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise self.error("falha simulada")
+        return '{"scenes": []}'
+
+def test_storyboard_client_retries_transient_errors():
+    backend = FlakyBackend(failures=2)
+    client = StoryboardClient(backend, cache_dir=None, max_retries=3, backoff_s=0)
+    assert client.complete("robô") == '{"scenes": []}'
+    assert backend.calls == 3
+    assert client.stats()["novas_tentativas"] == 2
+    client.shutdown()
+
+def test_storyboard_client_gives_up_after_max_retries():
+    backend = FlakyBackend(failures=10)
+    client = StoryboardClient(backend, cache_dir=None, max_retries=2, backoff_s=0)
+    with pytest.raises(ConnectionError):
+        client.complete("robô")
+    assert backend.calls == 3
+    client.shutdown()
+
+def test_storyboard_client_does_not_retry_permanent_errors():
+    backend = FlakyBackend(failures=10, error=KeyError)
+    client = StoryboardClient(backend, cache_dir=None, max_retries=3, backoff_s=0)
+    with pytest.raises(KeyError):
+        client.complete("robô")
+    assert backend.calls == 1
+    client.shutdown()
@@ -0,0 +1,118 @@
+import logging
+from bisect import bisect_right
+from collections import OrderedDict
+from transitions import get_transition
+
+logger = logging.getLogger(__name__)
+
+TRANSITION_TYPES = ["dissolve", "crossfade", "fade"]
+OVERLAP_TRANSITIONS = {"dissolve"}  # Transições que sobrepõem o fim da cena anterior
+MAX_CACHED_SCENES = 3  # Cenas montadas mantidas em memória (o acesso aos frames é sequencial)
+
+def plan_transitions(durations, enabled=True):
+    """Tipo e duração da transição de entrada de cada cena (a primeira cena não tem transição)"""
+    if not enabled:
+        return [(None, 0.0)] * max(1, len(durations))  # Cortes secos
+    plan = [(None, 0.0)]
+    for i in range(1, len(durations)):
+        # Usar vários tipos de transição de forma alternada para variedade
+        transition_type = TRANSITION_TYPES[i % len(TRANSITION_TYPES)]
+        # Duração da transição - mais curta para clipes curtos
+        transition_duration = min(1.0, min(durations[i-1], durations[i]) / 4)
+        plan.append((transition_type, transition_duration))
+    return plan
+
+def scene_start_times(durations, transitions):
+    """Início de cada cena na linha do tempo final (o dissolve sobrepõe o fim da cena anterior)"""
+    starts = [0.0]
+    for i in range(1, len(durations)):
+        transition_type, transition_duration = transitions[i]
+        overlap = transition_duration if transition_type in OVERLAP_TRANSITIONS else 0.0
+        starts.append(starts[-1] + durations[i-1] - overlap)
+    return starts
+
+class TimelineSegment:
+    """Trecho da linha do tempo: uma cena sozinha ou uma transição entre duas cenas"""
+
+    __slots__ = ("start", "end", "scene", "previous_scene", "transition")
+
+    def __init__(self, start, end, scene, previous_scene=None, transition=None):
+        self.start = start
+        self.end = end
+        self.scene = scene
+        self.previous_scene = previous_scene
+        self.transition = transition
+
+class Timeline:
+    """Lista plana de trechos (edit decision list) com índice ordenado por tempo.
+
+    Um frame no instante t é resolvido por busca binária em O(log n) para no
+    máximo duas cenas (com suas sobreposições, como legendas) mais a transição.
+    As cenas são montadas sob demanda por scene_factory(i) e só as mais
+    recentes ficam em memória.
+    """
+
+    def __init__(self, durations, scene_factory, size, transitions=None):
+        self.durations = list(durations)
+        self.scene_factory = scene_factory
+        self.size = size
+        self.transitions = transitions or plan_transitions(self.durations)
+        self.starts = scene_start_times(self.durations, self.transitions)
+        self.duration = self.starts[-1] + self.durations[-1] if self.durations else 0.0
+        self.segments = self._build_segments()
+        self.segment_starts = [segment.start for segment in self.segments]
+        self._scenes = OrderedDict()
+        self._engines = {}
+
+    def _build_segments(self):
+        segments = []
+        for i, (start, duration) in enumerate(zip(self.starts, self.durations)):
+            transition_type, transition_duration = self.transitions[i]
+            scene_start = start
+            if transition_type and transition_duration > 0:
+                # Transição de entrada: dissolve mistura com a cena anterior, fade/crossfade parte do preto
+                previous = i - 1 if transition_type in OVERLAP_TRANSITIONS and i > 0 else None
+                engine = transition_type if previous is not None else "fadein"
+                segments.append(TimelineSegment(start, start + transition_duration, i, previous, engine))
+                scene_start = start + transition_duration
+            next_type, next_duration = self.transitions[i + 1] if i + 1 < len(self.durations) else (None, 0.0)
+            scene_end = start + duration - (next_duration if next_type in OVERLAP_TRANSITIONS else 0.0)
+            if scene_end > scene_start:
+                segments.append(TimelineSegment(scene_start, scene_end, i))
+        return segments
+
+    def scene(self, index):
+        """Clipe visual da cena, montado sob demanda com cache LRU"""
+        clip = self._scenes.get(index)
+        if clip is None:
+            clip = self.scene_factory(index)
+            self._scenes[index] = clip
+            if len(self._scenes) > MAX_CACHED_SCENES:
+                self._scenes.popitem(last=False)
+        else:
+            self._scenes.move_to_end(index)
+        return clip
+
+    def _engine(self, name):
+        engine = self._engines.get(name)
+        if engine is None:
+            engine = self._engines[name] = get_transition(name, self.size)
+        return engine
+
+    def segment_at(self, t):
+        """Trecho ativo no instante t (busca binária)"""
+        idx = bisect_right(self.segment_starts, t) - 1
+        return self.segments[min(max(idx, 0), len(self.segments) - 1)]
+
+    def scene_frame(self, index, t):
+        local_t = min(max(t - self.starts[index], 0.0), self.durations[index])
+        return self.scene(index).get_frame(local_t)
+
+    def make_frame(self, t):
+        segment = self.segment_at(t)
+        frame = self.scene_frame(segment.scene, t)
+        if segment.transition is None:
+            return frame
+        progress = min(1.0, max(0.0, (t - segment.start) / (segment.end - segment.start)))
+        previous = self.scene_frame(segment.previous_scene, t) if segment.previous_scene is not None else None
+        return self._engine(segment.transition).blend(previous, frame, progress)
@@ -0,0 +1,131 @@
+import logging
+from abc import ABC, abstractmethod
+from functools import lru_cache
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Registro de transições: nome -> classe com blend(frame1, frame2, progress)
+TRANSITIONS = {}
+
+DISSOLVE_NOISE_LEVELS = 1  # Amplitude (em níveis de 0-255, para mais e para menos) do grão do dissolve
+ZOOM_AMOUNT = 0.2
+
+def register_transition(*names):
+    """Decorador que registra uma classe de transição sob um ou mais nomes"""
+    def decorator(cls):
+        for name in names:
+            TRANSITIONS[name] = cls
+        return cls
+    return decorator
+
+def get_transition(name, size):
+    """Cria a transição registrada para a resolução (width, height); tipos desconhecidos viram fade"""
+    cls = TRANSITIONS.get(name)
+    if cls is None:
+        logger.warning(f"Transição '{name}' não registrada, usando fade")
+        cls = TRANSITIONS["fade"]
+    return cls(size)
+
+class Transition(ABC):
+    """Base das transições: mistura dois frames uint8 em um buffer pré-alocado.
+
+    O array retornado por blend é reutilizado na chamada seguinte.
+    """
+
+    def __init__(self, size):
+        self.width, self.height = size
+        self.out = np.empty((self.height, self.width, 3), dtype=np.uint8)
+
+    @abstractmethod
+    def blend(self, frame1, frame2, progress):
+        """Frame da transição em progress (0 = só frame1, 1 = só frame2)"""
+
+@register_transition("fade", "crossfade")
+class CrossfadeTransition(Transition):
+    """Mistura linear entre as duas cenas"""
+
+    def blend(self, frame1, frame2, progress):
+        cv2.addWeighted(frame1, 1 - progress, frame2, progress, 0, dst=self.out)
+        return self.out
+
+@register_transition("fadein")
+class FadeFromBlackTransition(Transition):
+    """Entrada da segunda cena a partir do preto (frame1 é ignorado)"""
+
+    def blend(self, frame1, frame2, progress):
+        cv2.convertScaleAbs(frame2, dst=self.out, alpha=progress)
+        return self.out
+
+@lru_cache(maxsize=4)
+def dissolve_noise(width, height, levels=DISSOLVE_NOISE_LEVELS, seed=0):
+    """Grão de média zero do dissolve, gerado uma vez por resolução.
+
+    Retorna as partes positiva e negativa (uint8) de uma textura com o dobro
+    da altura, para que cada frame use uma janela diferente sem cópias.
+    """
+    rng = np.random.default_rng(seed)
+    noise = rng.integers(-levels, levels + 1, (2 * height, width, 3), dtype=np.int16)
+    return np.clip(noise, 0, None).astype(np.uint8), np.clip(-noise, 0, None).astype(np.uint8)
+
+@register_transition("dissolve")
+class DissolveTransition(Transition):
+    """Dissolução com grão de filme pré-calculado, que muda a cada frame"""
+
+    def __init__(self, size):
+        super().__init__(size)
+        self.noise_up, self.noise_down = dissolve_noise(self.width, self.height)
+
+    def blend(self, frame1, frame2, progress):
+        cv2.addWeighted(frame1, 1 - progress, frame2, progress, 0, dst=self.out)
+        # Deslocamento da janela derivado do progresso: o grão varia entre frames e não clareia a média
+        offset = int(progress * 7919) % self.height
+        cv2.add(self.out, self.noise_up[offset:offset + self.height], dst=self.out)
+        cv2.subtract(self.out, self.noise_down[offset:offset + self.height], dst=self.out)
+        return self.out
+
+@register_transition("wipe")
+class WipeTransition(Transition):
+    """Transição de varredura da esquerda para a direita, estilo Star Wars"""
+
+    def blend(self, frame1, frame2, progress):
+        wipe_x = int(self.width * progress)
+        self.out[:, wipe_x:] = frame1[:, wipe_x:]
+        self.out[:, :wipe_x] = frame2[:, :wipe_x]
+        return self.out
+
+@register_transition("zoom")
+class ZoomTransition(Transition):
+    """A cena atual aproxima (1.0 -> 1.2) enquanto a próxima se afasta (1.2 -> 1.0), com dissolução"""
+
+    def __init__(self, size):
+        super().__init__(size)
+        self.zoomed1 = np.empty_like(self.out)
+        self.zoomed2 = np.empty_like(self.out)
+
+    def _zoom(self, frame, zoom, dst):
+        # Recorte central subpixel seguido de um único resize de volta para a resolução final
+        if zoom <= 1.0:
+            np.copyto(dst, frame)
+            return dst
+        patch = cv2.getRectSubPix(frame, (int(round(self.width / zoom)), int(round(self.height / zoom))),
+                                  ((self.width - 1) / 2, (self.height - 1) / 2))
+        cv2.resize(patch, (self.width, self.height), dst=dst, interpolation=cv2.INTER_LINEAR)
+        return dst
+
+    def blend(self, frame1, frame2, progress):
+        self._zoom(frame1, 1 + ZOOM_AMOUNT * progress, self.zoomed1)
+        self._zoom(frame2, 1 + ZOOM_AMOUNT * (1 - progress), self.zoomed2)
+        cv2.addWeighted(self.zoomed1, 1 - progress, self.zoomed2, progress, 0, dst=self.out)
+        return self.out
+
+def audio_gain_ramp(audio_clip, duration, fade_in):
+    """Aplica um fade linear vetorizado (por bloco de amostras) a um clipe de áudio do moviepy"""
+    def apply(get_frame, t):
+        gain = np.clip(np.asarray(t, dtype=np.float32) / duration, 0, 1)
+        if not fade_in:
+            gain = 1 - gain
+        frames = get_frame(t)
+        return frames * (gain[:, None] if frames.ndim == 2 else gain)
+    return audio_clip.fl(apply, keep_duration=True)
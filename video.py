@@ -1,280 +1,325 @@
 import os
+import json
 import numpy as np
-from moviepy.editor import (
-    ImageClip, concatenate_videoclips, AudioFileClip, CompositeVideoClip,
-    TextClip, ColorClip, VideoFileClip, VideoClip, CompositeAudioClip, concatenate_audioclips
-)
-import moviepy.video.fx.all as vfx
-import moviepy.audio.fx.all as afx
-import moviepy.config as mp_config
+# Só as classes do núcleo do moviepy: o moviepy.editor (todos os fx, scipy.ndimage...) leva ~1 s
+# para importar e é carregado apenas pelas funções legadas que dependem dele
+from moviepy.video.VideoClip import VideoClip
+from moviepy.audio.io.AudioFileClip import AudioFileClip
 import logging
 import random
+import time
+from functools import lru_cache
 import cv2
-from scipy.interpolate import interp1d
+from PIL import Image
+from subtitles import SubtitleRenderer
+from transitions import get_transition, audio_gain_ramp
+from encoder import FFmpegPipeWriter, encoder_settings, iter_clip_frames, encode_audio_track
+from audio import build_audio_track
+from timeline import Timeline, plan_transitions
+import metrics
 
 # Configurar logging
 logger = logging.getLogger(__name__)
 
-# Verificar e configurar o caminho do ImageMagick
-if not mp_config.IMAGEMAGICK_BINARY:
-    mp_config.IMAGEMAGICK_BINARY = "/usr/bin/convert"  # Caminho padrão no Colab após instalação
+def _moviepy_editor():
+    """Importa o moviepy.editor sob demanda (resize/crop/fx nos clipes e TextClip)"""
+    import moviepy.editor as editor
+    import moviepy.config as mp_config
+    # Verificar e configurar o caminho do ImageMagick
+    if not mp_config.IMAGEMAGICK_BINARY:
+        mp_config.IMAGEMAGICK_BINARY = "/usr/bin/convert"  # Caminho padrão no Colab após instalação
+    return editor
+
+# Banco de grão de filme: poucas texturas pequenas reaproveitadas com deslocamento/rotação
+GRAIN_BANK_TILES = 8
+GRAIN_TILE_SIZE = 256
 
 # Efeitos cinematográficos avançados
 class CinematicEffects:
     @staticmethod
-    def film_grain(clip, intensity=0.05):
-        """Adiciona grão de filme cinematográfico"""
-        def add_grain(image):
-            grain = np.random.normal(0, intensity * 255, image.shape)
-            noisy_image = np.clip(image.astype(float) + grain, 0, 255).astype('uint8')
-            return noisy_image
-        
-        return clip.fl_image(add_grain)
+    @lru_cache(maxsize=8)
+    def grain_bank(intensity, seed=0, n_tiles=GRAIN_BANK_TILES, tile_size=GRAIN_TILE_SIZE):
+        """Banco de texturas de grão int16 pré-geradas (determinístico para o seed)"""
+        rng = np.random.default_rng(seed)
+        grain = rng.normal(0, intensity * 255, (n_tiles, tile_size, tile_size, 3))
+        return np.clip(np.round(grain), -255, 255).astype(np.int16)
     
     @staticmethod
-    def cinematic_color_grading(clip, style="drama"):
-        """Aplicar color grading cinematográfico"""
-        styles = {
-            "drama": {"contrast": 1.2, "saturation": 0.85, "brightness": 0.95, "temp": 0.95},
-            "thriller": {"contrast": 1.3, "saturation": 0.7, "brightness": 0.8, "temp": 0.8},
-            "romance": {"contrast": 1.1, "saturation": 1.1, "brightness": 1.05, "temp": 1.05},
-            "sci_fi": {"contrast": 1.15, "saturation": 0.9, "brightness": 0.9, "temp": 1.2}
+    def grain_frame(image, bank, frame_key, seed=0):
+        """Aplica ao frame uma textura do banco, com deslocamento e rotação sorteados pelo frame_key"""
+        rng = np.random.default_rng((seed, frame_key))
+        tile = bank[rng.integers(len(bank))]
+        tile = np.rot90(tile, k=int(rng.integers(4)))
+        tile = np.roll(tile, (int(rng.integers(tile.shape[0])), int(rng.integers(tile.shape[1]))), axis=(0, 1))
+        height, width = image.shape[:2]
+        # Separar em partes positiva e negativa para usar soma/subtração saturadas em uint8
+        positive = np.ascontiguousarray(np.clip(tile, 0, 255).astype(np.uint8))
+        negative = np.ascontiguousarray(np.clip(-tile, 0, 255).astype(np.uint8))
+        pad_y, pad_x = max(0, height - tile.shape[0]), max(0, width - tile.shape[1])
+        positive = cv2.copyMakeBorder(positive, 0, pad_y, 0, pad_x, cv2.BORDER_WRAP)[:height, :width]
+        negative = cv2.copyMakeBorder(negative, 0, pad_y, 0, pad_x, cv2.BORDER_WRAP)[:height, :width]
+        return cv2.subtract(cv2.add(image, positive), negative)
+    
+    @staticmethod
+    def film_grain(clip, intensity=0.05, seed=0):
+        """Adiciona grão de filme cinematográfico (texturas pré-geradas, determinístico para o seed)"""
+        bank = CinematicEffects.grain_bank(intensity, seed)
+        # O sorteio de cada frame depende só do tempo, então o resultado não muda entre renderizações
+        return clip.fl(lambda gf, t: CinematicEffects.grain_frame(gf(t), bank, int(round(t * 1000)), seed))
+    
+    GRADING_STYLES = {
+        "drama": {"contrast": 1.2, "saturation": 0.85, "brightness": 0.95, "temp": 0.95},
+        "thriller": {"contrast": 1.3, "saturation": 0.7, "brightness": 0.8, "temp": 0.8},
+        "romance": {"contrast": 1.1, "saturation": 1.1, "brightness": 1.05, "temp": 1.05},
+        "sci_fi": {"contrast": 1.15, "saturation": 0.9, "brightness": 0.9, "temp": 1.2}
+    }
+    
+    @staticmethod
+    def register_grading_style(name, contrast=1.0, saturation=1.0, brightness=1.0, temp=1.0):
+        """Registra um estilo de color grading definido pelo usuário"""
+        CinematicEffects.GRADING_STYLES[name] = {
+            "contrast": contrast, "saturation": saturation, "brightness": brightness, "temp": temp
         }
-        
-        params = styles.get(style, styles["drama"])
-        
-        # Aplicar ajustes de cor
-        graded_clip = clip.fx(vfx.colorx, params["contrast"])  # Contraste
+    
+    @staticmethod
+    def grading_params(style):
+        """Resolve o estilo (nome registrado ou dicionário de parâmetros)"""
+        if isinstance(style, dict):
+            return {**{"contrast": 1.0, "saturation": 1.0, "brightness": 1.0, "temp": 1.0}, **style}
+        styles = CinematicEffects.GRADING_STYLES
+        return styles.get(style, styles["drama"])
+    
+    @staticmethod
+    def grade_reference(image, params):
+        """Cadeia original de ajustes (contraste, saturação, brilho, temperatura), usada para compilar a LUT"""
+        # Contraste (equivalente ao vfx.colorx)
+        image = np.minimum(255, params["contrast"] * image).astype('uint8')
         
         # Ajuste de saturação
-        def adjust_saturation(image):
+        if params["saturation"] != 1.0:
             hsv = cv2.cvtColor(image, cv2.COLOR_RGB2HSV).astype(float)
             hsv[:,:,1] = hsv[:,:,1] * params["saturation"]
             hsv[:,:,1] = np.clip(hsv[:,:,1], 0, 255)
-            return cv2.cvtColor(hsv.astype('uint8'), cv2.COLOR_HSV2RGB)
+            image = cv2.cvtColor(hsv.astype('uint8'), cv2.COLOR_HSV2RGB)
         
         # Ajuste de brilho
-        def adjust_brightness(image):
-            return np.clip(image.astype(float) * params["brightness"], 0, 255).astype('uint8')
+        image = np.clip(image.astype(float) * params["brightness"], 0, 255).astype('uint8')
         
         # Ajuste de temperatura
-        def adjust_temp(image):
-            # Aumenta o azul (mais frio) ou vermelho (mais quente)
-            b, g, r = cv2.split(image)
-            if params["temp"] < 1:  # Mais frio (azulado)
-                b = np.clip(b.astype(float) * (2 - params["temp"]), 0, 255).astype('uint8')
-            else:  # Mais quente (avermelhado)
-                r = np.clip(r.astype(float) * params["temp"], 0, 255).astype('uint8')
-            return cv2.merge([b, g, r])
-        
-        # Aplicar efeitos em sequência
-        graded_clip = graded_clip.fl_image(adjust_saturation)
-        graded_clip = graded_clip.fl_image(adjust_brightness)
-        graded_clip = graded_clip.fl_image(adjust_temp)
+        b, g, r = cv2.split(image)
+        if params["temp"] < 1:  # Mais frio (azulado)
+            b = np.clip(b.astype(float) * (2 - params["temp"]), 0, 255).astype('uint8')
+        else:  # Mais quente (avermelhado)
+            r = np.clip(r.astype(float) * params["temp"], 0, 255).astype('uint8')
+        return cv2.merge([b, g, r])
+    
+    @staticmethod
+    @lru_cache(maxsize=32)
+    def _compile_grading_lut(param_items):
+        params = dict(param_items)
+        ramp = np.repeat(np.arange(256, dtype=np.uint8)[:, None, None], 3, axis=2)
+        if params["saturation"] == 1.0:
+            # Todos os ajustes são por canal: uma LUT 1D de 256 entradas por canal
+            return "1d", CinematicEffects.grade_reference(ramp, params)
+        # Saturação mistura canais: LUTs 1D exatas antes (contraste) e depois (brilho, temperatura)
+        # e só a mistura de saturação calculada por pixel, sem quantizar a curva tonal
+        identity = {"contrast": 1.0, "saturation": 1.0, "brightness": 1.0, "temp": 1.0}
+        pre = CinematicEffects.grade_reference(ramp, {**identity, "contrast": params["contrast"]})
+        post = CinematicEffects.grade_reference(ramp, {**params, "contrast": 1.0, "saturation": 1.0})
+        return "saturation", (pre, params["saturation"], post)
+    
+    @staticmethod
+    def apply_saturation(image, saturation):
+        """Escala a saturação como no HSV: mantém V = max(r, g, b) e o matiz, com S limitado a 1"""
+        r, g, b = cv2.split(image)
+        value = cv2.max(cv2.max(r, g), b)
+        value3 = cv2.merge([value] * 3)
+        if saturation <= 1.0:
+            # c' = V - s * (V - c) = s * c + (1 - s) * V
+            return cv2.addWeighted(image, saturation, value3, 1 - saturation, 0)
+        # S' = min(1, s * S): o fator de cada pixel é limitado para o canal mínimo não passar de zero
+        low = cv2.min(cv2.min(r, g), b)
+        factor = cv2.min(cv2.divide(value, cv2.max(cv2.subtract(value, low), 1), dtype=cv2.CV_32F), saturation)
+        spread = cv2.multiply(cv2.subtract(value3, image), cv2.merge([factor] * 3), dtype=cv2.CV_8U)
+        return cv2.subtract(value3, spread)
+    
+    @staticmethod
+    def compile_grading_lut(style):
+        """Compila o estilo em uma LUT (cacheada por parâmetros)"""
+        params = CinematicEffects.grading_params(style)
+        return CinematicEffects._compile_grading_lut(tuple(sorted(params.items())))
+    
+    @staticmethod
+    def apply_grading_lut(image, lut):
+        """Aplica a LUT compilada a um frame RGB uint8"""
+        kind, table = lut
+        if kind == "1d":
+            return cv2.LUT(image, table)
+        pre, saturation, post = table
+        return cv2.LUT(CinematicEffects.apply_saturation(cv2.LUT(image, pre), saturation), post)
+    
+    @staticmethod
+    def grade_image(image, style="drama"):
+        """Aplica o color grading a uma única imagem"""
+        return CinematicEffects.apply_grading_lut(image, CinematicEffects.compile_grading_lut(style))
+    
+    @staticmethod
+    def cinematic_color_grading(clip, style="drama"):
+        """Aplicar color grading cinematográfico (LUT compilada uma vez, uma consulta por frame)"""
+        lut = CinematicEffects.compile_grading_lut(style)
+        return clip.fl_image(lambda image: CinematicEffects.apply_grading_lut(image, lut))
+    
+    @staticmethod
+    @lru_cache(maxsize=8)
+    def vignette_mask(width, height, intensity=0.3):
+        """Máscara de vinheta em uint8 (0-255) por canal, calculada uma vez por resolução e intensidade"""
+        x = np.linspace(-1, 1, width, dtype=np.float32)
+        y = np.linspace(-1, 1, height, dtype=np.float32)
+        radius = np.sqrt(x[None, :] ** 2 + y[:, None] ** 2)
         
-        return graded_clip
+        # Criar máscara de vinheta
+        vignette = np.clip(1 - intensity * radius, 0, 1)
+        vignette = np.round(vignette * 255).astype(np.uint8)
+        return cv2.merge([vignette] * 3)  # Aplicar aos 3 canais RGB
+    
+    @staticmethod
+    def apply_vignette(image, intensity=0.3):
+        """Aplica a vinheta a um frame com multiplicação inteira saturada"""
+        height, width = image.shape[:2]
+        mask = CinematicEffects.vignette_mask(width, height, intensity)
+        return cv2.multiply(image, mask, scale=1 / 255)
     
     @staticmethod
     def vignette_effect(clip, intensity=0.3):
         """Adiciona efeito de vinheta cinematográfica"""
-        def add_vignette(image):
-            height, width = image.shape[:2]
-            x = np.linspace(-1, 1, width)
-            y = np.linspace(-1, 1, height)
-            X, Y = np.meshgrid(x, y)
-            radius = np.sqrt(X**2 + Y**2)
-            
-            # Criar máscara de vinheta
-            vignette = np.clip(1 - intensity * radius, 0, 1)
-            vignette = np.dstack([vignette] * 3)  # Aplicar aos 3 canais RGB
-            
-            # Aplicar vinheta
-            return np.clip(image.astype(float) * vignette, 0, 255).astype('uint8')
+        return clip.fl_image(lambda image: CinematicEffects.apply_vignette(image, intensity))
+    
+    @staticmethod
+    def apply_depth_of_field(image, focus_point=(0.5, 0.5), blur_intensity=5):
+        """Desfoque gradual a partir do ponto focal aplicado a uma única imagem"""
+        height, width = image.shape[:2]
+        focus_x, focus_y = int(width * focus_point[0]), int(height * focus_point[1])
         
-        return clip.fl_image(add_vignette)
+        # Criar máscara de distância do ponto focal
+        Y, X = np.ogrid[:height, :width]
+        dist_from_focus = np.sqrt((X - focus_x)**2 + (Y - focus_y)**2)
+        max_dist = np.sqrt(width**2 + height**2) / 2
+        blur_amount = np.clip(dist_from_focus / max_dist, 0, 1) * blur_intensity
+        
+        # Aplicar desfoque variável baseado na distância
+        result = image.copy()
+        for blur in range(1, int(blur_intensity) + 1, 2):
+            mask = (blur_amount >= blur - 1) & (blur_amount < blur + 1)
+            if not np.any(mask):
+                continue
+                
+            blurred = cv2.GaussianBlur(image, (blur * 2 + 1, blur * 2 + 1), 0)
+            result[mask] = blurred[mask]
+            
+        return result
     
     @staticmethod
     def depth_of_field(clip, focus_point=(0.5, 0.5), blur_intensity=5):
         """Simula profundidade de campo com desfoque gradual"""
-        def apply_dof(image):
-            height, width = image.shape[:2]
-            focus_x, focus_y = int(width * focus_point[0]), int(height * focus_point[1])
-            
-            # Criar máscara de distância do ponto focal
-            Y, X = np.ogrid[:height, :width]
-            dist_from_focus = np.sqrt((X - focus_x)**2 + (Y - focus_y)**2)
-            max_dist = np.sqrt(width**2 + height**2) / 2
-            blur_amount = np.clip(dist_from_focus / max_dist, 0, 1) * blur_intensity
-            
-            # Aplicar desfoque variável baseado na distância
-            result = image.copy()
-            for blur in range(1, int(blur_intensity) + 1, 2):
-                mask = (blur_amount >= blur - 1) & (blur_amount < blur + 1)
-                if not np.any(mask):
-                    continue
-                    
-                blurred = cv2.GaussianBlur(image, (blur * 2 + 1, blur * 2 + 1), 0)
-                result[mask] = blurred[mask]
-                
-            return result
-            
-        return clip.fl_image(apply_dof)
+        return clip.fl_image(lambda image: CinematicEffects.apply_depth_of_field(image, focus_point, blur_intensity))
+    
+    @staticmethod
+    def split_effects(effects):
+        """Separa os efeitos da cena em invariantes à fonte (aplicados uma vez na imagem) e por frame.
+
+        Cada efeito é um dicionário {"name": ..., **parâmetros}. Color grading e
+        profundidade de campo não dependem do movimento de câmera; a vinheta só
+        vai para a imagem de origem com "before_motion": True.
+        """
+        source, per_frame = [], []
+        for effect in effects or []:
+            name = effect["name"]
+            if name == "vignette":
+                (source if effect.get("before_motion") else per_frame).append(effect)
+            elif name in SOURCE_EFFECTS:
+                source.append(effect)
+            elif name in FRAME_EFFECTS:
+                per_frame.append(effect)
+            else:
+                raise ValueError(f"Efeito desconhecido: {name}")
+        return source, per_frame
+    
+    @staticmethod
+    def apply_source_effects(image, effects):
+        """Aplica os efeitos invariantes à imagem de origem da cena"""
+        for effect in effects:
+            params = {key: value for key, value in effect.items() if key not in ("name", "before_motion")}
+            image = SOURCE_EFFECTS[effect["name"]](image, **params)
+        return image
+    
+    @staticmethod
+    def apply_frame_effects(clip, effects):
+        """Aplica os efeitos que dependem do frame final (após o movimento de câmera)"""
+        for effect in effects:
+            params = {key: value for key, value in effect.items() if key not in ("name", "before_motion")}
+            clip = FRAME_EFFECTS[effect["name"]](clip, **params)
+        return clip
+
+# Efeitos que só dependem da imagem de origem: aplicados uma vez por cena, antes do movimento
+SOURCE_EFFECTS = {
+    "color_grading": lambda image, style="drama": CinematicEffects.grade_image(image, style),
+    "depth_of_field": CinematicEffects.apply_depth_of_field,
+    "vignette": CinematicEffects.apply_vignette
+}
+
+# Efeitos aplicados a cada frame já na resolução final
+FRAME_EFFECTS = {
+    "film_grain": CinematicEffects.film_grain,
+    "vignette": CinematicEffects.vignette_effect
+}
+
+@lru_cache(maxsize=8)
+def _load_scene_source(image_path, mtime_ns, effects_key):
+    image = np.asarray(Image.open(image_path).convert("RGB"))
+    image = CinematicEffects.apply_source_effects(image, json.loads(effects_key))
+    image.setflags(write=False)
+    return image
+
+def load_scene_source(image_path, effects=()):
+    """Imagem de origem da cena com os efeitos invariantes já aplicados (cacheada por arquivo e parâmetros)"""
+    effects_key = json.dumps(list(effects), sort_keys=True)
+    return _load_scene_source(image_path, os.stat(image_path).st_mtime_ns, effects_key)
 
 def create_cinematic_transition(clip1, clip2, transition_type="fade", duration=1.0):
-    """Cria transições cinematográficas entre cenas"""
+    """Cria transições cinematográficas entre cenas usando o motor de transições em uint8"""
+    from moviepy.audio.AudioClip import CompositeAudioClip
+    from moviepy.video.compositing.concatenate import concatenate_videoclips
     # Garantir que ambos os clipes existam e tenham duração adequada
     if clip1.duration < duration or clip2.duration < duration:
         # Se algum clipe for menor que a duração da transição, usar crossfade simples
         transition_type = "fade"
     
-    if transition_type == "fade":
-        # Usar crossfadein e crossfadeout nativos do moviepy
-        return concatenate_videoclips([
-            clip1.subclip(0, clip1.duration - duration/2),
-            CompositeVideoClip([
-                clip1.subclip(clip1.duration - duration, clip1.duration).crossfadeout(duration),
-                clip2.subclip(0, duration).crossfadein(duration)
-            ])
-        ])
-    
-    elif transition_type == "wipe":
-        # Transição de varredura, estilo Star Wars
-        def make_frame(t):
-            progress = t / duration
-            width = clip1.w
-            height = clip1.h
-            
-            # Obter frames dos clipes originais
-            t1 = clip1.duration - duration + t
-            t2 = t
-            
-            if t1 <= clip1.duration and t2 <= clip2.duration:
-                frame1 = clip1.get_frame(t1)
-                frame2 = clip2.get_frame(t2)
-                
-                wipeX = int(width * progress)
-                result = frame1.copy()
-                if wipeX > 0:
-                    result[:, :wipeX] = frame2[:, :wipeX]
-                return result
-            elif t2 <= clip2.duration:
-                return clip2.get_frame(t2)
-            else:
-                return np.zeros((height, width, 3), dtype='uint8')
-                
-        # Criar um clipe para a transição
-        transition_clip = VideoClip(make_frame, duration=duration)
-        transition_clip = transition_clip.set_audio(CompositeAudioClip([
-            clip1.audio.subclip(clip1.duration - duration, clip1.duration).volumex(lambda t: 1-t/duration),
-            clip2.audio.subclip(0, duration).volumex(lambda t: t/duration)
-        ]) if clip1.audio is not None and clip2.audio is not None else None)
-        
-        # Concatenar os clipes
-        result = concatenate_videoclips([
-            clip1.subclip(0, clip1.duration - duration),
-            transition_clip,
-            clip2.subclip(duration)
-        ], method="compose")
-        
-        return result
+    engine = get_transition(transition_type, clip1.size)
     
-    elif transition_type == "dissolve":
-        # Dissolução com textura de filme
-        def make_frame(t):
-            progress = t / duration
-            texture_noise = np.random.rand(clip1.h, clip1.w, 3) * 0.15
-            
-            # Obter frames dos clipes originais
-            t1 = clip1.duration - duration + t
-            t2 = t
-            
-            if t1 <= clip1.duration and t2 <= clip2.duration:
-                frame1 = clip1.get_frame(t1).astype(float) * (1 - progress)
-                frame2 = clip2.get_frame(t2).astype(float) * progress
-                
-                result = frame1 + frame2 + texture_noise
-                return np.clip(result, 0, 255).astype('uint8')
-            elif t2 <= clip2.duration:
-                return clip2.get_frame(t2)
-            else:
-                return np.zeros((clip1.h, clip1.w, 3), dtype='uint8')
-                
-        # Criar um clipe para a transição
-        transition_clip = VideoClip(make_frame, duration=duration)
-        transition_clip = transition_clip.set_audio(CompositeAudioClip([
-            clip1.audio.subclip(clip1.duration - duration, clip1.duration).volumex(lambda t: 1-t/duration),
-            clip2.audio.subclip(0, duration).volumex(lambda t: t/duration)
-        ]) if clip1.audio is not None and clip2.audio is not None else None)
-        
-        # Concatenar os clipes
-        result = concatenate_videoclips([
-            clip1.subclip(0, clip1.duration - duration),
-            transition_clip,
-            clip2.subclip(duration)
-        ], method="compose")
-        
-        return result
+    def make_frame(t):
+        # Obter frames dos clipes originais e misturar no buffer da transição
+        frame1 = clip1.get_frame(min(clip1.duration - duration + t, clip1.duration))
+        frame2 = clip2.get_frame(min(t, clip2.duration))
+        return engine.blend(frame1, frame2, min(1.0, t / duration))
     
-    elif transition_type == "zoom":
-        # Transição com zoom
-        def make_frame(t):
-            progress = t / duration
-            
-            # Obter frames dos clipes originais
-            t1 = clip1.duration - duration + t
-            t2 = t
-            
-            if t1 <= clip1.duration and t2 <= clip2.duration:
-                # Calcular tamanhos de zoom
-                zoom1 = 1 + 0.2 * progress  # Zoom out
-                zoom2 = 1.2 - 0.2 * progress  # Zoom in
-                
-                # Redimensionar frames
-                h, w = clip1.h, clip1.w
-                frame1 = clip1.get_frame(t1)
-                frame2 = clip2.get_frame(t2)
-                
-                # Redimensionar (simulação simplificada)
-                # Em uma implementação real, usaríamos cv2.resize aqui
-                frame1_zoomed = frame1
-                frame2_zoomed = frame2
-                
-                # Misturar os frames com cross dissolve
-                result = frame1_zoomed.astype(float) * (1 - progress) + frame2_zoomed.astype(float) * progress
-                return np.clip(result, 0, 255).astype('uint8')
-            elif t2 <= clip2.duration:
-                return clip2.get_frame(t2)
-            else:
-                return np.zeros((clip1.h, clip1.w, 3), dtype='uint8')
-        
-        # Criar um clipe para a transição
-        transition_clip = VideoClip(make_frame, duration=duration)
+    # Criar um clipe para a transição
+    transition_clip = VideoClip(make_frame, duration=duration)
+    if clip1.audio is not None and clip2.audio is not None:
         transition_clip = transition_clip.set_audio(CompositeAudioClip([
-            clip1.audio.subclip(clip1.duration - duration, clip1.duration).volumex(lambda t: 1-t/duration),
-            clip2.audio.subclip(0, duration).volumex(lambda t: t/duration)
-        ]) if clip1.audio is not None and clip2.audio is not None else None)
-        
-        # Concatenar os clipes
-        result = concatenate_videoclips([
-            clip1.subclip(0, clip1.duration - duration),
-            transition_clip,
-            clip2.subclip(duration)
-        ], method="compose")
-        
-        return result
-    
-    else:
-        # Fallback para crossfade simples
-        return concatenate_videoclips([
-            clip1.subclip(0, clip1.duration - duration/2),
-            CompositeVideoClip([
-                clip1.subclip(clip1.duration - duration, clip1.duration).crossfadeout(duration),
-                clip2.subclip(0, duration).crossfadein(duration)
-            ])
-        ])
+            audio_gain_ramp(clip1.audio.subclip(clip1.duration - duration, clip1.duration), duration, fade_in=False),
+            audio_gain_ramp(clip2.audio.subclip(0, duration), duration, fade_in=True)
+        ]))
+    
+    # Concatenar os clipes
+    return concatenate_videoclips([
+        clip1.subclip(0, clip1.duration - duration),
+        transition_clip,
+        clip2.subclip(duration)
+    ], method="compose")
 
 def apply_dynamic_camera_movement(clip, duration, movement_type="dolly", final_resolution=(1920, 1080)):
     """Aplica movimentos de câmera cinematográficos"""
+    vfx = _moviepy_editor().vfx
     width, height = final_resolution
     
     # Redimensionar para ter espaço para movimento
@@ -377,6 +422,8 @@ def apply_dynamic_camera_movement(clip, duration, movement_type="dolly", final_r
 def create_dynamic_subtitles(text, duration, final_resolution):
     """Cria legendas dinâmicas word-by-word sem fundo"""
     logger.info(f"Gerando legendas dinâmicas para o texto: '{text}' com duração {duration}s")
+    editor = _moviepy_editor()
+    TextClip, CompositeVideoClip, vfx = editor.TextClip, editor.CompositeVideoClip, editor.vfx
     width, height = final_resolution
     words = text.split()
     word_duration = duration / len(words)
@@ -430,6 +477,56 @@ def create_dynamic_subtitles(text, duration, final_resolution):
     
     return subtitle_composite
 
+class KenBurnsFrames:
+    """Gera os frames do zoom suave (Ken Burns) direto da imagem original.
+
+    A trajetória de zoom é pré-calculada com a escala em ponto flutuante de cada
+    frame. Cada frame sai de um recorte subpixel seguido de um resize com essa
+    escala exata (fx = fy), e o centro do recorte compensa o arredondamento do
+    tamanho: o zoom é contínuo e a proporção não oscila entre frames. O frame é
+    escrito sempre no mesmo buffer de saída (o array retornado é reutilizado a
+    cada chamada).
+    """
+
+    MARGIN = 1  # Pixels do resize descartados em cada borda antes do frame final
+
+    def __init__(self, image, final_resolution, duration, fps=24, zoom_start=1.0, zoom_end=1.15, cover_margin=1.1):
+        self.source = np.ascontiguousarray(image[:, :, :3])
+        self.width, self.height = final_resolution
+        self.duration = duration
+        self.fps = fps
+        src_h, src_w = self.source.shape[:2]
+        # Escala base para cobrir toda a tela, com 10% extra como no recorte original
+        base_scale = max(self.width / src_w, self.height / src_h) * cover_margin
+        n_frames = max(1, int(np.ceil(duration * fps)) + 1)
+        times = np.arange(n_frames) / fps
+        scales = base_scale * (zoom_start + (zoom_end - zoom_start) * np.clip(times / duration, 0, 1))
+        # Nunca mostrar além das bordas da imagem original
+        self.scales = np.maximum(scales, max(self.width / src_w, self.height / src_h))
+        # Recorte inteiro com folga para o frame caber no resize após descartar MARGIN
+        self.patch_sizes = np.stack([
+            np.ceil((self.width + 2 * self.MARGIN) / self.scales) + 1,
+            np.ceil((self.height + 2 * self.MARGIN) / self.scales) + 1
+        ], axis=1).astype(int)
+        # Centro (subpixel) do recorte que leva o centro da imagem ao centro do frame
+        center_x, center_y = (src_w - 1) / 2, (src_h - 1) / 2
+        self.centers = np.stack([
+            center_x - (self.MARGIN + self.width / 2) / self.scales + self.patch_sizes[:, 0] / 2,
+            center_y - (self.MARGIN + self.height / 2) / self.scales + self.patch_sizes[:, 1] / 2
+        ], axis=1)
+        self.out = np.empty((self.height, self.width, 3), dtype=np.uint8)
+
+    def __call__(self, t):
+        idx = min(max(int(t * self.fps + 1e-6), 0), len(self.scales) - 1)
+        patch_w, patch_h = self.patch_sizes[idx]
+        scale = float(self.scales[idx])
+        patch = cv2.getRectSubPix(self.source, (int(patch_w), int(patch_h)), tuple(self.centers[idx]))
+        # Sem dsize o OpenCV usa fx/fy exatos no mapeamento (e não a razão entre tamanhos inteiros)
+        scaled = cv2.resize(patch, None, fx=scale, fy=scale, interpolation=cv2.INTER_LINEAR)
+        m = self.MARGIN
+        np.copyto(self.out, scaled[m:m + self.height, m:m + self.width])
+        return self.out
+
 def create_scene_clip(item, config):
     """Cria um clipe de cena com zoom suave e garantindo preenchimento total da tela"""
     logger.info(f"Criando clipe para a cena: {item.get('image_path')}")
@@ -439,195 +536,113 @@ def create_scene_clip(item, config):
     if not image_path or not os.path.exists(image_path):
         raise FileNotFoundError(f"Arquivo de imagem não encontrado: {image_path}")
     
-    width, height = config.final_resolution
-    
-    # Criar clipe da imagem
-    img_clip = ImageClip(image_path)
-    
-    # Calcular proporções para garantir que a imagem cubra toda a tela
-    img_width, img_height = img_clip.size
-    
-    # Determinar o fator de escala para garantir que a imagem cubra toda a tela
-    width_ratio = width / img_width
-    height_ratio = height / img_height
-    scale_factor = max(width_ratio, height_ratio) * 1.1  # Adiciona 10% extra para garantir cobertura
-    
-    # Redimensionar a imagem para garantir cobertura total
-    img_clip = img_clip.resize(width=img_width*scale_factor, height=img_height*scale_factor)
+    # Efeitos invariantes (grading, profundidade de campo...) são aplicados uma vez na imagem de origem
+    source_effects, frame_effects = CinematicEffects.split_effects(config.scene_effects)
+    image = load_scene_source(image_path, source_effects)
     
-    # Centralizar a imagem
-    img_clip = img_clip.set_position("center")
-    
-    # Aplicar efeito de zoom suave e lento
+    # Zoom de 1.0 até 1.15 ao longo da duração, gerado direto na resolução final
     duration = item["duration"]
+    frames = KenBurnsFrames(image, config.final_resolution, duration, fps=config.fps)
+    return CinematicEffects.apply_frame_effects(VideoClip(frames, duration=duration), frame_effects)
+
+def build_scene_visual(item, config):
+    """Cria o clipe visual de uma cena (zoom suave + legendas dinâmicas, se habilitadas)"""
+    scene = create_scene_clip(item, config)
     
-    def zoom_effect(t):
-        # Zoom aumenta de 1.0 até 1.15 (15% de zoom) ao longo da duração
-        zoom_factor = 1.0 + (0.15 * t / duration)
-        return zoom_factor
-    
-    # Aplicar efeito de zoom à imagem
-    zoomed_clip = img_clip.fx(
-        vfx.resize, 
-        lambda t: zoom_effect(t)
-    )
+    # Adicionar legendas dinâmicas se solicitado
+    if config.add_subtitles:
+        logger.info(f"Adicionando legendas dinâmicas para a cena: {item.get('image_path')}")
+        try:
+            renderer = SubtitleRenderer(item["prompt"], item["duration"], config.final_resolution, font=config.subtitle_font)
+            # O frame do Ken Burns é um buffer reescrito a cada chamada, então pode ser desenhado no lugar
+            scene = renderer.apply(scene, inplace=True)
+        except Exception as e:
+            logger.error(f"Erro ao criar legendas: {e}")
     
-    # Cortar para garantir que estamos exatamente no tamanho desejado
-    result_clip = zoomed_clip.set_duration(duration).crop(
-        x_center=zoomed_clip.w/2,
-        y_center=zoomed_clip.h/2,
-        width=width,
-        height=height
+    return scene
+
+def build_timeline(content_data, config):
+    """Linha do tempo plana do vídeo; as cenas são montadas sob demanda durante a renderização"""
+    return Timeline(
+        [item["duration"] for item in content_data],
+        lambda i: build_scene_visual(content_data[i], config),
+        config.final_resolution,
+        transitions=plan_transitions([item["duration"] for item in content_data], config.transitions)
     )
-    
-    return result_clip
+
+def write_with_ffmpeg_pipe(final_video, output_path, config, audio_wav=None):
+    """Renderiza o vídeo enviando os frames direto para o ffmpeg, com o áudio pré-codificado em AAC"""
+    settings = encoder_settings(config)
+    logger.info(f"Encoder ffmpeg por pipe: {settings}")
+    audio_track = None
+    if audio_wav is not None:
+        audio_track = os.path.splitext(output_path)[0] + "_audio.m4a"
+        with metrics.span("encode_audio"):
+            encode_audio_track(audio_wav, audio_track)
+    try:
+        with FFmpegPipeWriter(output_path, config.final_resolution, config.fps, audio_path=audio_track, **settings) as writer:
+            writer.write_frames(iter_clip_frames(final_video, config.fps))
+    finally:
+        if audio_track and os.path.exists(audio_track):
+            os.remove(audio_track)
+    return output_path
 
 def create_narrative_video(config, content_data):
     logger.info(f"Iniciando criação do vídeo com add_subtitles={config.add_subtitles}")
     logger.info(f"Conteúdo recebido: {len(content_data)} cenas")
     
-    clips = []
+    if config.render_mode == "segments":
+        # Renderização paralela por cena, juntando os segmentos sem recodificar
+        from segments import render_segments
+        return render_segments(config, content_data)
     
     for i, item in enumerate(content_data):
-        try:
-            # Verificar se temos todos os dados necessários
-            if not item.get("duration"):
-                raise ValueError(f"Cena {i+1} não tem duração definida")
-            if not item.get("audio_clip"):
-                raise ValueError(f"Cena {i+1} não tem áudio definido")
-            
-            logger.info(f"Processando cena {i+1} com duração {item['duration']}s")
-            
-            # Criar clipe da cena principal
-            scene_clip = create_scene_clip(item, config)
-            audio_clip = item["audio_clip"]
-            
-            # Adicionar áudio à cena
-            scene = scene_clip.set_audio(audio_clip)
-            
-            # Adicionar legendas dinâmicas se solicitado
-            if config.add_subtitles:
-                logger.info(f"Adicionando legendas dinâmicas para a cena {i+1}")
-                try:
-                    subtitle_clip = create_dynamic_subtitles(
-                        item["prompt"], 
-                        item["duration"], 
-                        config.final_resolution
-                    )
-                    
-                    # Combinar cena principal com legendas
-                    scene = CompositeVideoClip(
-                        [scene, subtitle_clip],
-                        size=config.final_resolution
-                    )
-                except Exception as e:
-                    logger.error(f"Erro ao criar legendas: {e}")
-            
-            clips.append(scene)
-        except Exception as e:
-            logger.error(f"Erro ao processar cena {i+1}: {e}")
-            raise
+        # Verificar se temos todos os dados necessários
+        if not item.get("duration"):
+            raise ValueError(f"Cena {i+1} não tem duração definida")
+        if not item.get("audio_path"):
+            raise ValueError(f"Cena {i+1} não tem áudio definido")
     
-    # Verificar se temos clipes para concatenar
-    if not clips:
+    if not content_data:
         raise ValueError("Nenhum clipe válido foi criado")
     
-    # Criar transições dinâmicas entre cenas
-    final_clips = []
+    # Cada frame é resolvido por busca binária na linha do tempo (no máximo duas cenas + transição),
+    # em vez de atravessar composições aninhadas do moviepy
+    timeline = build_timeline(content_data, config)
+    logger.info(f"Linha do tempo: {len(timeline.segments)} trechos, {timeline.duration:.2f}s")
+    final_video = VideoClip(timeline.make_frame, duration=timeline.duration)
     
-    if len(clips) == 1:
-        final_clips = clips
-    else:
-        # Primeiro clipe permanece como está
-        final_clips.append(clips[0])
-        
-        # Criar transições para cada par de clipes subsequentes
-        for i in range(1, len(clips)):
-            prev_clip = clips[i-1]
-            current_clip = clips[i]
-            
-            # Usar vários tipos de transição de forma alternada para variedade
-            transition_types = ["dissolve", "crossfade", "fade"]
-            transition_type = transition_types[i % len(transition_types)]
-            
-            # Duração da transição - mais curta para clipes curtos
-            min_duration = min(prev_clip.duration, current_clip.duration)
-            transition_duration = min(1.0, min_duration / 4)
-            
-            try:
-                if transition_type == "crossfade" or transition_type == "fade":
-                    # Usar o crossfadein nativo da MoviePy
-                    transition_clip = vfx.crossfadein(current_clip, transition_duration)
-                    final_clips.append(transition_clip)
-                    
-                elif transition_type == "dissolve":
-                    # Transição com dissolução
-                    # Calcular o ponto inicial de transição no clipe anterior
-                    overlap_start = max(0, prev_clip.duration - transition_duration)
-                    
-                    # Recortar o final do clipe anterior para a transição
-                    clip1_part = prev_clip.subclip(0, overlap_start)
-                    
-                    # Criar uma região de sobreposição
-                    overlap = CompositeVideoClip([
-                        prev_clip.subclip(overlap_start).set_opacity(lambda t: 1 - t/transition_duration),
-                        current_clip.subclip(0, transition_duration).set_opacity(lambda t: t/transition_duration)
-                    ])
-                    
-                    # Adicionar o resto do clipe atual
-                    clip2_part = current_clip.subclip(transition_duration)
-                    
-                    # Concatenar as partes sem transição
-                    composite = concatenate_videoclips([clip1_part, overlap, clip2_part], method="compose")
-                    final_clips[-1] = composite
-                else:
-                    # Fallback para adição simples se a transição falhar
-                    final_clips.append(current_clip)
-            except Exception as e:
-                logger.error(f"Erro ao aplicar transição: {e}")
-                # Adicionar o clipe atual sem transição em caso de erro
-                final_clips.append(current_clip)
-    
-    # Concatenar os clipes finais
-    final_video = concatenate_videoclips(final_clips, method="compose")
-    
-    # Adicionar música de fundo se especificada
-    if hasattr(config, 'audio_path') and config.audio_path and os.path.exists(config.audio_path):
-        try:
-            bg_audio = AudioFileClip(config.audio_path)
-            bg_audio = bg_audio.volumex(0.2)  # Volume baixo para não competir com a narração
-            
-            # Ajustar duração da música
-            if bg_audio.duration < final_video.duration:
-                # Repetir o áudio para cobrir todo o vídeo
-                repeats = int(np.ceil(final_video.duration / bg_audio.duration))
-                bg_audio_parts = [bg_audio] * repeats
-                bg_audio_extended = concatenate_audioclips(bg_audio_parts)
-                bg_audio = bg_audio_extended.subclip(0, final_video.duration)
-            else:
-                bg_audio = bg_audio.subclip(0, final_video.duration)
-            
-            # Misturar com o áudio existente
-            if final_video.audio is not None:
-                final_audio = CompositeAudioClip([final_video.audio, bg_audio])
-                final_video = final_video.set_audio(final_audio)
-            else:
-                final_video = final_video.set_audio(bg_audio)
-        except Exception as e:
-            logger.error(f"Erro ao adicionar música de fundo: {e}")
+    # Montar narração e música de fundo em memória, nos mesmos offsets das cenas
+    output_path = os.path.join(config.output_dir, config.output_filename)
+    audio_wav = os.path.splitext(output_path)[0] + "_audio.wav"
+    with metrics.span("audio", cenas=len(content_data)):
+        build_audio_track(content_data, timeline.starts, timeline.transitions, timeline.duration, config, audio_wav)
     
     # Renderizar vídeo final
-    output_path = os.path.join(config.output_dir, config.output_filename)
     print(f"Renderizando vídeo... Duração total: {final_video.duration:.2f}s")
     
-    final_video.write_videofile(
-        output_path, 
-        fps=24, 
-        codec="libx264", 
-        audio_codec="aac", 
-        bitrate="5000k",
-        threads=4
-    )
+    n_frames = int(round(timeline.duration * config.fps))
+    try:
+        # Frames e encode acontecem juntos (pipe), então o span mede os dois
+        with metrics.span("render_encode", backend=config.output_backend, frames=n_frames) as span:
+            start = time.perf_counter()
+            if config.output_backend == "ffmpeg":
+                write_with_ffmpeg_pipe(final_video, output_path, config, audio_wav)
+            else:
+                final_video = final_video.set_audio(AudioFileClip(audio_wav))
+                final_video.write_videofile(
+                    output_path, 
+                    fps=config.fps, 
+                    codec="libx264", 
+                    audio_codec="aac", 
+                    bitrate=config.bitrate,
+                    preset=config.encoder_preset or "medium",
+                    threads=4
+                )
+            span["fps"] = n_frames / max(time.perf_counter() - start, 1e-9)
+    finally:
+        if os.path.exists(audio_wav):
+            os.remove(audio_wav)
     
     print(f"Vídeo narrativo salvo em: {output_path}")
     return output_path
\ No newline at end of file